@@ -1,6 +1,7 @@
 import sys
 import os
 import logging
+import threading
 from typing import List, Dict
 from scl.meta.capability import Capability
 from scl.otel.metric_decorator import record_latency
@@ -11,7 +12,12 @@ scl_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(scl_root)
 from scl.otel.otel import tracer
 from scl.storage.base import StoreBase
+from scl.storage.cachedstore import CachedStore
 from scl.meta.msg import Msg
+from scl.config import config
+from scl.executor.compiled import CompiledCapCache
+from scl.executor.sandbox import ProcessSandbox
+from scl.semcache import SemanticCache
 
 class CapRegistry:
     def __init__(self, StoreBase: StoreBase):
@@ -22,6 +28,29 @@ class CapRegistry:
             StoreBase: An instance of any StoreBase implementation
         """
         self.cap_store = StoreBase
+        ## name lookups are served from a read-through cache, invalidated by the store's catalog version
+        if StoreBase is not None and config.catalog_cache_size > 0 and not isinstance(StoreBase, CachedStore):
+            self.cap_store = CachedStore(StoreBase, config.catalog_cache_size, config.catalog_version_interval)
+        # compiled function_impl, keyed by (name, impl hash, arg names); functions run in this module's globals as before
+        self.compiled_caps = CompiledCapCache(config.cap_compile_cache_size, globals())
+        # CAP_EXECUTOR=process runs function_impl in a warm pool of sandbox processes instead
+        self.sandbox = None
+        if config.cap_executor == "process":
+            self.sandbox = ProcessSandbox(config.sandbox_workers, config.sandbox_timeout,
+                                          config.sandbox_memory_mb, config.cap_compile_cache_size)
+        elif config.cap_executor != "inline":
+            raise ValueError(f"Unknown CAP_EXECUTOR '{config.cap_executor}', expected 'inline' or 'process'")
+        # similarity/history results of recent queries, dropped when the store's catalog version moves
+        self.result_caches = {}
+        if config.semantic_cache_size > 0:
+            self.result_caches = {
+                channel: SemanticCache(config.semantic_cache_size, config.semantic_cache_ttl,
+                                       config.semantic_cache_radius, name=channel)
+                for channel in ("similarity", "history")
+            }
+        self._cached_catalog_version = None
+        # clearing on a version change and filling must not interleave
+        self._result_cache_lock = threading.Lock()
     
     ## RAG search between context and function description after embedding
     ## Return function in openAI tool format
@@ -32,14 +61,36 @@ class CapRegistry:
         if self.cap_store is None:
             logging.info("Database not initialized. Cannot perform similarity search.")
             return {}
-        for tool_name in ToolNames:
-            logging.info(f"Searching for function: {tool_name}")
-            function = self.get_cap_by_name(tool_name)
-            logging.info(f"Function: {function}")
-            if function:
-                functions[tool_name]=function
+        if not ToolNames:
+            return functions
+        logging.info(f"Searching for functions: {ToolNames}")
+        ## one store round trip for all names
+        functions = self.cap_store.get_caps_by_names(ToolNames)
+        logging.info(f"Functions: {list(functions)}")
         return functions
     
+    def _cached(self, channel, search, msg: Msg, limit, min_similarity) -> Dict[str, Capability]:
+        # stores report a failed search as None; it is answered as {} and never cached
+        cache = self.result_caches.get(channel)
+        if cache is None or self.cap_store is None:
+            return search(msg, limit, min_similarity) or {}
+        version = self.cap_store.catalog_version()
+        with self._result_cache_lock:
+            if version != self._cached_catalog_version:
+                for result_cache in self.result_caches.values():
+                    result_cache.clear()
+                self._cached_catalog_version = version
+        scope = (limit, min_similarity)
+        result = cache.get(msg.embed, scope)
+        if result is None:
+            result = search(msg, limit, min_similarity)
+            if result is not None:
+                with self._result_cache_lock:
+                    # skip the fill if the catalog changed while we were searching
+                    if version == self._cached_catalog_version:
+                        cache.put(msg.embed, result, scope)
+        return result if result is not None else {}
+
     ## make this class fits basestore interface
     @tracer.start_as_current_span("getCapsByName")
     def get_cap_by_name(self, name)-> Capability:
@@ -50,31 +101,38 @@ class CapRegistry:
     @tracer.start_as_current_span("getCapsBySimilarity")
     @record_latency(search_time_histogram, "search")
     def getCapsBySimilarity(self, msg: Msg, limit=5, min_similarity=0.5) -> Dict[str, Capability]:
-        return self.cap_store.search_by_similarity(msg, limit, min_similarity)
+        return self._cached("similarity", self.cap_store.search_by_similarity, msg, limit, min_similarity)
     
     @tracer.start_as_current_span("invoke_cap_safe")
     @record_latency(tool_execute_time_histogram)
     def call_cap_safe(self, cap: Capability, args_dict=None):
         ## todo replace by https://github.com/langchain-ai/langchain-sandbox?
         ## todo replace by e2b?
-        """动态创建函数并执行"""
-        func_code = cap.function_impl
-        func_lines = [f"def dynamic_func({', '.join(args_dict.keys())}):"]
-        func_lines.extend([f"    {line}" for line in func_code.split('\n')])
-        func_def = '\n'.join(func_lines)
-        local_vars = {}
+        """动态创建函数并执行, 编译结果按(名称, 实现哈希, 参数名)缓存"""
+        args_dict = args_dict or {}
         ## todo debug/trace
-        logging.info(f"args_dict: {args_dict}")
-        logging.info(f"func_def: {func_def}")
-        exec(func_def, globals(), local_vars)
-        func = local_vars['dynamic_func']
+        logging.debug(f"args_dict: {args_dict}")
+        if self.sandbox is not None:
+            return self.sandbox.call(cap.name, cap.function_impl, args_dict)
+        func = self.compiled_caps.get(cap.name, cap.function_impl, args_dict.keys())
         return func(**args_dict)
 
+    def close(self):
+        """Stop the sandbox workers, if any"""
+        if self.sandbox is not None:
+            self.sandbox.close()
+
     @tracer.start_as_current_span("record_cap_history_safe")
     def record(self, msg: Msg, cap: Capability):
-        return self.cap_store.record(msg, cap)
+        result = self.cap_store.record(msg, cap)
+        ## a new record can change any history answer, not only this query's
+        history_cache = self.result_caches.get("history")
+        if history_cache is not None:
+            history_cache.clear()
+        return result
 
     @tracer.start_as_current_span("getCapsByHistory")
     @record_latency(search_time_histogram, "search")
     def getCapsByHistory(self, msg: Msg, limit=5, min_similarity=0.5) -> Dict[str, Capability]:
-        return self.cap_store.getCapsByHistory(msg, limit, min_similarity)
+        ## cleared by record(); records written by other processes show up after SEMANTIC_CACHE_TTL
+        return self._cached("history", self.cap_store.getCapsByHistory, msg, limit, min_similarity)
@@ -9,10 +9,84 @@ class Config:
     
     # 直接从环境变量获取值, something ground truth won't change
     otlp_endpoint: str = os.getenv("OTLP_ENDPOINT", "http://localhost:4318")
+    # 嵌入后端: openai(兼容OpenAI的远程服务) / hash(本地确定性嵌入, 用于压测与CI)
+    embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "openai")
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "BAAI/bge-large-zh-v1.5")
     embedding_model_dims: int = int(os.getenv("EMBEDDING_MODEL_DIMS", "1024"))
     embedding_api_key: Optional[str] = os.getenv("EMBEDDING_API_KEY")
     embedding_base_url: str = os.getenv("EMBEDDING_BASE_URL", "https://api.siliconflow.cn/v1")
+    # 单次embeddings.create请求最多携带的文本数
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    # 合并并发embed()调用的最长等待时间(毫秒), 0表示不合并
+    embedding_batch_wait_ms: float = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+    # 嵌入请求限流, 0表示不限制, 只在服务端返回429/超时时退避
+    embedding_requests_per_second: float = float(os.getenv("EMBEDDING_REQUESTS_PER_SECOND", "0"))
+    embedding_tokens_per_minute: float = float(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "0"))
+    embedding_max_retries: int = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+    # 本地嵌入缓存(SQLite), 路径为空表示禁用
+    embedding_cache_path: str = os.getenv("EMBEDDING_CACHE_PATH", os.path.join("~", ".cache", "scl", "embeddings.sqlite3"))
+    embedding_cache_max_entries: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+
+    # Msg嵌入内容: first(第一条消息) / last_user(最后一条用户消息) / last_n_user(最后N条用户消息)
+    msg_embed_policy: str = os.getenv("MSG_EMBED_POLICY", "last_user")
+    msg_embed_turns: int = int(os.getenv("MSG_EMBED_TURNS", "3"))
+
+    # fsstore后台轮询技能目录的间隔(秒)
+    fsstore_watch_interval: float = float(os.getenv("FSSTORE_WATCH_INTERVAL", "5"))
+    # fsstore导入技能时解析SKILL.md与并发嵌入的线程数
+    fsstore_ingest_workers: int = int(os.getenv("FSSTORE_INGEST_WORKERS", "8"))
+    fsstore_embed_workers: int = int(os.getenv("FSSTORE_EMBED_WORKERS", "2"))
+    # fsstore内存调用历史: 容量, 淘汰策略(age/lfu), 是否定期快照到磁盘
+    fsstore_history_capacity: int = int(os.getenv("FSSTORE_HISTORY_CAPACITY", "4096"))
+    fsstore_history_eviction: str = os.getenv("FSSTORE_HISTORY_EVICTION", "age")
+    fsstore_history_snapshot: bool = os.getenv("FSSTORE_HISTORY_SNAPSHOT", "false").lower() in ("1", "true", "yes")
+    fsstore_history_snapshot_every: int = int(os.getenv("FSSTORE_HISTORY_SNAPSHOT_EVERY", "50"))
+    # fsstore近似检索: flat为精确检索, ivf在技能数达到阈值后启用倒排索引
+    fsstore_ann: str = os.getenv("FSSTORE_ANN", "flat")
+    fsstore_ann_min_size: int = int(os.getenv("FSSTORE_ANN_MIN_SIZE", "10000"))
+    # ivf聚类数(0表示自动取sqrt(n))与每次查询探测的聚类数, 探测越多召回越高、越慢
+    fsstore_ivf_nlist: int = int(os.getenv("FSSTORE_IVF_NLIST", "0"))
+    fsstore_ivf_nprobe: int = int(os.getenv("FSSTORE_IVF_NPROBE", "8"))
+    # 首轮检索(按名称/相似度/历史)并发执行的线程数, 以及每个检索通道的超时(秒, 0表示不超时)
+    retrieval_workers: int = int(os.getenv("RETRIEVAL_WORKERS", "16"))
+    retrieval_timeout: float = float(os.getenv("RETRIEVAL_TIMEOUT", "2"))
+    # 同一轮多个tool_calls并发执行的线程数(1表示串行)
+    tool_call_workers: int = int(os.getenv("TOOL_CALL_WORKERS", "8"))
+    # call_cap_safe编译结果缓存的条目数(LRU)
+    cap_compile_cache_size: int = int(os.getenv("CAP_COMPILE_CACHE_SIZE", "256"))
+    # 检索结果语义缓存: 条目数(0表示关闭), 过期时间(秒), 近似命中的余弦距离半径
+    semantic_cache_size: int = int(os.getenv("SEMANTIC_CACHE_SIZE", "1024"))
+    semantic_cache_ttl: float = float(os.getenv("SEMANTIC_CACHE_TTL", "300"))
+    semantic_cache_radius: float = float(os.getenv("SEMANTIC_CACHE_RADIUS", "0.02"))
+    # 按名称查询能力的进程内缓存条目数(0表示关闭), 以及检查存储端目录版本号的最小间隔(秒)
+    catalog_cache_size: int = int(os.getenv("CATALOG_CACHE_SIZE", "1024"))
+    catalog_version_interval: float = float(os.getenv("CATALOG_VERSION_INTERVAL", "1"))
+    # PgVectorStore连接池: 最小/最大连接数, 借用等待超时(秒), 空闲多久后借出前做健康检查(秒), 建连重试次数
+    pg_pool_min: int = int(os.getenv("PG_POOL_MIN", "1"))
+    pg_pool_max: int = int(os.getenv("PG_POOL_MAX", "10"))
+    pg_pool_timeout: float = float(os.getenv("PG_POOL_TIMEOUT", "30"))
+    pg_pool_health_check_interval: float = float(os.getenv("PG_POOL_HEALTH_CHECK_INTERVAL", "30"))
+    pg_connect_retries: int = int(os.getenv("PG_CONNECT_RETRIES", "5"))
+    # pgvector距离度量(cosine/l2/ip), 决定索引opclass与查询操作符; 索引类型(hnsw/ivfflat)
+    pg_vector_metric: str = os.getenv("PG_VECTOR_METRIC", "cosine")
+    pg_vector_index: str = os.getenv("PG_VECTOR_INDEX", "hnsw")
+    # hnsw建索引参数m/ef_construction, 以及每次查询的ef_search
+    pg_hnsw_m: int = int(os.getenv("PG_HNSW_M", "16"))
+    pg_hnsw_ef_construction: int = int(os.getenv("PG_HNSW_EF_CONSTRUCTION", "64"))
+    pg_hnsw_ef_search: int = int(os.getenv("PG_HNSW_EF_SEARCH", "40"))
+    # ivfflat的lists(0表示按行数计算)与每次查询的probes(0表示sqrt(lists))
+    pg_ivfflat_lists: int = int(os.getenv("PG_IVFFLAT_LISTS", "0"))
+    pg_ivfflat_probes: int = int(os.getenv("PG_IVFFLAT_PROBES", "0"))
+    # 建索引时的maintenance_work_mem, 如"1GB"; 空表示使用服务端设置
+    pg_index_build_mem: str = os.getenv("PG_INDEX_BUILD_MEM", "")
+    # insert_capabilities每批计算嵌入并COPY的能力数
+    pg_ingest_chunk_size: int = int(os.getenv("PG_INGEST_CHUNK_SIZE", "1000"))
+    # 能力执行方式: inline在当前进程exec, process在预启动的沙箱进程池中执行
+    cap_executor: str = os.getenv("CAP_EXECUTOR", "inline")
+    # 沙箱进程数(0表示CPU核数), 单次调用超时(秒)与每个进程的内存上限(MB, 0表示不限)
+    sandbox_workers: int = int(os.getenv("SANDBOX_WORKERS", "0"))
+    sandbox_timeout: float = float(os.getenv("SANDBOX_TIMEOUT", "30"))
+    sandbox_memory_mb: int = int(os.getenv("SANDBOX_MEMORY_MB", "512"))
 
     ## todo, vars here may changes
     limit: int = int(os.getenv("LIMIT", "5"))
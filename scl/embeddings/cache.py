@@ -0,0 +1,171 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+from functools import lru_cache
+from typing import List, Optional, Sequence
+from scl.config import config
+from scl.otel.otel import embedding_cache_hit_counter, embedding_cache_miss_counter
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different inputs share one cache entry."""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    Disk-backed, size-bounded LRU cache of embedding vectors.
+
+    Entries are keyed by sha256(model, dims, normalized text) and stored as
+    float32 blobs in a SQLite database in WAL mode, so several worker processes
+    on one host can read and write the same file. Every connection is private to
+    its thread and process. Once the table grows past `max_entries`, the least
+    recently used rows are deleted.
+
+    Reads stay reads as far as possible: a hit only rewrites last_used when the
+    stored value is older than TOUCH_INTERVAL seconds, so hot entries cost one
+    write per interval instead of one per lookup, and LRU order is kept to that
+    resolution. The size is checked (COUNT(*) and trim) once every
+    `max_entries // TRIM_FRACTION` rows written by this process, so the table
+    may briefly exceed `max_entries` by about that much per process.
+
+    Cache failures are logged and treated as misses; they never fail an embed call.
+    """
+
+    # seconds a hit may leave last_used untouched
+    TOUCH_INTERVAL = 60.0
+    # the size is checked every max_entries // TRIM_FRACTION written rows
+    TRIM_FRACTION = 100
+
+    def __init__(self, path: str, model: str, dims: int, max_entries: int = 100000):
+        self.path = os.path.expanduser(path)
+        self.model = model
+        self.dims = int(dims)
+        self.max_entries = max(1, int(max_entries))
+        self._local = threading.local()
+        self._trim_every = max(1, self.max_entries // self.TRIM_FRACTION)
+        self._written_since_trim = 0
+        self._trim_lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # a connection inherited through fork must not be reused by the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def key(self, text: str) -> str:
+        payload = f"{self.model}\x00{self.dims}\x00{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached vector for each text, or None where it is missing."""
+        keys = [self.key(text) for text in texts]
+        found = {}
+        try:
+            conn = self._connection()
+            unique_keys = list(dict.fromkeys(keys))
+            now = time.time()
+            stale = []
+            # stay well below SQLITE_MAX_VARIABLE_NUMBER
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, vector, last_used in rows:
+                    found[key] = vector
+                    if now - last_used >= self.TOUCH_INTERVAL:
+                        stale.append(key)
+            if stale:
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                 [(now, key) for key in stale])
+        except sqlite3.Error as e:
+            logging.warning(f"Embedding cache lookup failed: {e}")
+            found = {}
+        results = [np.frombuffer(found[key], dtype=np.float32) if key in found else None
+                   for key in keys]
+        hits = sum(result is not None for result in results)
+        if hits:
+            embedding_cache_hit_counter.add(hits, {"model": self.model})
+        if len(results) - hits:
+            embedding_cache_miss_counter.add(len(results) - hits, {"model": self.model})
+        return results
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        return self.get_many([text])[0]
+
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        """Store vectors for texts; every so often trim the table back to `max_entries`."""
+        now = time.time()
+        rows = [(self.key(text), np.asarray(embedding, dtype=np.float32).tobytes(), now)
+                for text, embedding in zip(texts, embeddings)]
+        if not rows:
+            return
+        with self._trim_lock:
+            self._written_since_trim += len(rows)
+            trim = self._written_since_trim >= self._trim_every
+            if trim:
+                self._written_since_trim = 0
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+                count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] if trim else 0
+                if count > self.max_entries:
+                    conn.execute("""
+                        DELETE FROM embeddings WHERE key IN (
+                            SELECT key FROM embeddings ORDER BY last_used LIMIT ?
+                        )
+                    """, (count - self.max_entries,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logging.warning(f"Embedding cache write failed: {e}")
+
+    def clear(self):
+        try:
+            self._connection().execute("DELETE FROM embeddings")
+        except sqlite3.Error as e:
+            logging.warning(f"Embedding cache clear failed: {e}")
+
+
+@lru_cache(maxsize=1)
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """获取全局嵌入缓存, EMBEDDING_CACHE_PATH为空时禁用"""
+    if not config.embedding_cache_path:
+        return None
+    try:
+        return EmbeddingCache(
+            config.embedding_cache_path,
+            model=config.embedding_model,
+            dims=config.embedding_model_dims,
+            max_entries=config.embedding_cache_max_entries,
+        )
+    except (sqlite3.Error, OSError) as e:
+        logging.warning(f"Embedding cache disabled: {e}")
+        return None
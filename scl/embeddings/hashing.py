@@ -0,0 +1,78 @@
+import re
+import hashlib
+import numpy as np
+from functools import lru_cache
+from typing import List
+from scl.config import config
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature_hash(feature: str) -> int:
+    # blake2b instead of hash(): stable across processes and PYTHONHASHSEED
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashingEmbedding:
+    """
+    Offline, deterministic embedder based on signed feature hashing.
+
+    Each text is split into lowercase words plus character trigrams, which also
+    covers CJK text without whitespace. Every feature is hashed into one of `dims`
+    buckets with a +/-1 sign, and each row is L2-normalized. Texts that share words
+    get a high cosine similarity. That is enough to exercise the retrieval stack
+    in benchmarks and CI without network access or an API key. The vectors carry
+    no real semantics.
+    """
+
+    def __init__(self, dims=None, ngram: int = 3):
+        self.model = "hashing"
+        self.embedding_dims = int(dims or config.embedding_model_dims)
+        self.ngram = ngram
+
+    def _features(self, text: str) -> List[str]:
+        text = " ".join(text.lower().split())
+        features = _WORD_RE.findall(text)
+        features.extend(f"#{text[i:i + self.ngram]}" for i in range(max(0, len(text) - self.ngram + 1)))
+        return features or [""]
+
+    def embed_many(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Embed many texts in one vectorized pass.
+
+        Args:
+            texts (List[str]): The texts to embed.
+        Returns:
+            List[np.ndarray]: One float32 embedding vector per text, in input order.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            rows.extend([row] * len(features))
+            hashes.extend(_feature_hash(feature) for feature in features)
+        rows = np.asarray(rows, dtype=np.int64)
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        buckets = (hashes % np.uint64(self.embedding_dims)).astype(np.int64)
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+        matrix = np.bincount(
+            rows * self.embedding_dims + buckets,
+            weights=signs,
+            minlength=len(texts) * self.embedding_dims,
+        ).reshape(len(texts), self.embedding_dims).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+        return list(matrix)
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    async def aembed_many(self, texts: List[str]) -> List[np.ndarray]:
+        # pure CPU and fast, no need to leave the event loop
+        return self.embed_many(texts)
+
+    async def aembed(self, text):
+        return self.embed(text)
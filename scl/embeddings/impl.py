@@ -1,33 +1,200 @@
 import os
 import time
+import queue
+import asyncio
 import logging
-from openai import OpenAI
+import threading
+import weakref
+import numpy as np
+from concurrent.futures import Future
+from typing import List, Optional
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APIConnectionError, InternalServerError
 from scl.otel.otel import tracer
+from scl.embeddings.ratelimit import TokenBucketRateLimiter, estimate_tokens, retry_after_seconds
+from scl.embeddings.cache import get_embedding_cache
+from scl.embeddings.hashing import HashingEmbedding
 from functools import lru_cache
 from scl.config import config
 
-class OpenAIEmbedding:
+
+# errors the SDK would retry itself; the clients use max_retries=0 and back off via the rate limiter
+# (APITimeoutError is an APIConnectionError, InternalServerError covers 5xx)
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+
+def as_embedding(vector) -> Optional[np.ndarray]:
+    """统一为连续的float32向量, 已是float32时不复制"""
+    if vector is None:
+        return None
+    return np.ascontiguousarray(vector, dtype=np.float32)
+
+
+class EmbeddingBatcher:
+    """
+    Coalesce concurrent embed() calls into one embeddings.create request.
+
+    Callers submit single texts and block on a Future. A daemon thread takes the
+    first pending text, keeps collecting for up to `max_wait` seconds or until
+    `max_batch_size` texts are queued, then embeds the whole batch at once.
+    """
+
+    def __init__(self, embed_many_fn, max_batch_size: int, max_wait: float):
+        self._embed_many = embed_many_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="scl-embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # identical texts in one window share a single input slot
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(unique_texts, self._embed_many(unique_texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            logging.debug(f"Coalesced {len(batch)} embed calls into {len(unique_texts)} inputs")
+            for text, future in batch:
+                future.set_result(vectors[text])
+
+
+class AsyncEmbeddingBatcher:
+    """
+    asyncio counterpart of EmbeddingBatcher.
+
+    Pending texts of one event loop are flushed as a single request when
+    `max_batch_size` is reached or `max_wait` seconds after the first arrival.
+    """
+
+    def __init__(self, embed_many_fn, max_batch_size: int, max_wait: float):
+        self._embed_many = embed_many_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self._pending = []
+        self._flush_handle = None
+        self._tasks = set()
+
+    async def submit(self, text: str):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            # keep a reference until done, the loop only holds weak ones
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = dict(zip(unique_texts, await self._embed_many(unique_texts)))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future in batch:
+            if not future.done():
+                future.set_result(vectors[text])
+
+
+class _OpenAIEmbeddingBase:
+    """Config, cache and rate limiter shared by the sync and async OpenAI clients."""
+
+    def _setup(self):
+        self.model = config.embedding_model
+        self.embedding_dims = config.embedding_model_dims
+        self.batch_size = max(1, config.embedding_batch_size)
+        self.max_retries = max(0, config.embedding_max_retries)
+        self.rate_limiter = get_rate_limiter()
+        # Check if API supports dimensions parameter (OpenAI supports it, SiliconFlow doesn't)
+        self.supports_dimensions = "openai.com" in config.embedding_base_url.lower()
+        self.cache = get_embedding_cache()
+
+    def _params(self, texts: List[str]) -> dict:
+        # Build parameters - only include dimensions if API supports it
+        params = {
+            "input": [text.replace("\n", " ") for text in texts],
+            "model": self.model
+        }
+        if self.supports_dimensions:
+            params["dimensions"] = int(self.embedding_dims)
+        return params
+
+    @staticmethod
+    def _vectors(data) -> List[np.ndarray]:
+        # the API may return items out of order, index maps them back
+        matrix = np.asarray([item.embedding for item in sorted(data, key=lambda item: item.index)], dtype=np.float32)
+        # rows are views into one contiguous float32 block
+        return list(matrix)
+
+
+class OpenAIEmbedding(_OpenAIEmbeddingBase):
     _instance = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance._initialized = False
         return cls._instance
-    
+
     def __init__(self):
         if self._initialized:
             return
-            
-        self.model = config.embedding_model
-        self.embedding_dims = config.embedding_model_dims
-
-        api_key = config.embedding_api_key
-        base_url = config.embedding_base_url
 
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
-        # Check if API supports dimensions parameter (OpenAI supports it, SiliconFlow doesn't)
-        self.supports_dimensions = "openai.com" in base_url.lower()
+        self._setup()
+        # retries are driven by the shared rate limiter so pushback is seen by all callers
+        self.client = OpenAI(api_key=config.embedding_api_key, base_url=config.embedding_base_url, max_retries=0)
+        self._batcher = None
+        if config.embedding_batch_wait_ms > 0:
+            self._batcher = EmbeddingBatcher(
+                self._embed_uncached,
+                max_batch_size=self.batch_size,
+                max_wait=config.embedding_batch_wait_ms / 1000.0,
+            )
         self._initialized = True
 
     @tracer.start_as_current_span("embed")
@@ -35,36 +202,248 @@ class OpenAIEmbedding:
         """
         Get the embedding for the given text using OpenAI.
 
+        The local cache is checked first; on a miss, concurrent calls are
+        coalesced into one request by the batcher.
+
         Args:
             text (str): The text to embed.
         Returns:
-            list: The embedding vector.
+            np.ndarray: The float32 embedding vector.
         """
-        time.sleep(5)  # to avoid timeout
-        logging.info(f"Embedding text: {text}")
-        text = text.replace("\n", " ")
-        
-        # Build parameters - only include dimensions if API supports it
-        params = {
-            "input": [text],
-            "model": self.model
-        }
-        if self.supports_dimensions:
-            params["dimensions"] = int(self.embedding_dims)
-        
-        return self.client.embeddings.create(**params).data[0].embedding
+        if self.cache is not None:
+            cached = self.cache.get(text)
+            if cached is not None:
+                return cached
+        if self._batcher is None:
+            return self._embed_uncached([text])[0]
+        return self._batcher.submit(text).result()
+
+    @tracer.start_as_current_span("embed_many")
+    def embed_many(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Get the embeddings for many texts, `batch_size` texts per request.
+        Texts already in the local cache are not sent.
+
+        Args:
+            texts (List[str]): The texts to embed.
+        Returns:
+            List[np.ndarray]: One float32 embedding vector per text, in input order.
+        """
+        texts = list(texts)
+        if self.cache is None:
+            return self._embed_uncached(texts)
+        embeddings = self.cache.get_many(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh = self._embed_uncached([texts[i] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+        return embeddings
+
+    def _embed_uncached(self, texts: List[str]) -> List[np.ndarray]:
+        embeddings = []
+        for start in range(0, len(texts), self.batch_size):
+            embeddings.extend(self._create(texts[start:start + self.batch_size]))
+        if self.cache is not None:
+            self.cache.put_many(texts, embeddings)
+        return embeddings
+
+    def _create(self, texts: List[str]) -> List[np.ndarray]:
+        logging.info(f"Embedding {len(texts)} texts")
+        params = self._params(texts)
+        tokens = estimate_tokens(params["input"])
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(tokens)
+            try:
+                data = self.client.embeddings.create(**params).data
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.rate_limiter.backoff(retry_after_seconds(e))
+        self.rate_limiter.success()
+        return self._vectors(data)
+
+
+class AsyncOpenAIEmbedding(_OpenAIEmbeddingBase):
+    """
+    Non-blocking OpenAI embedding client.
+
+    Shares config, the local cache and the rate limiter with OpenAIEmbedding, so
+    sync and async callers in one process see the same quota and cached vectors.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._setup()
+        self.client = AsyncOpenAI(api_key=config.embedding_api_key, base_url=config.embedding_base_url, max_retries=0)
+        # one batcher per event loop, futures must not cross loops
+        self._batchers = weakref.WeakKeyDictionary()
+        self._initialized = True
+
+    def _batcher(self):
+        if config.embedding_batch_wait_ms <= 0:
+            return None
+        loop = asyncio.get_running_loop()
+        batcher = self._batchers.get(loop)
+        if batcher is None:
+            batcher = AsyncEmbeddingBatcher(
+                self._aembed_uncached,
+                max_batch_size=self.batch_size,
+                max_wait=config.embedding_batch_wait_ms / 1000.0,
+            )
+            self._batchers[loop] = batcher
+        return batcher
+
+    async def aembed(self, text):
+        """
+        Get the embedding for the given text without blocking the event loop.
+
+        Args:
+            text (str): The text to embed.
+        Returns:
+            np.ndarray: The float32 embedding vector.
+        """
+        with tracer.start_as_current_span("aembed"):
+            if self.cache is not None:
+                # SQLite may wait on another process's write lock, keep it off the event loop
+                cached = await asyncio.to_thread(self.cache.get, text)
+                if cached is not None:
+                    return cached
+            batcher = self._batcher()
+            if batcher is None:
+                return (await self._aembed_uncached([text]))[0]
+            return await batcher.submit(text)
+
+    async def aembed_many(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Get the embeddings for many texts without blocking the event loop.
+
+        Args:
+            texts (List[str]): The texts to embed.
+        Returns:
+            List[np.ndarray]: One float32 embedding vector per text, in input order.
+        """
+        with tracer.start_as_current_span("aembed_many"):
+            texts = list(texts)
+            if self.cache is None:
+                return await self._aembed_uncached(texts)
+            embeddings = await asyncio.to_thread(self.cache.get_many, texts)
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            if missing:
+                fresh = await self._aembed_uncached([texts[i] for i in missing])
+                for i, embedding in zip(missing, fresh):
+                    embeddings[i] = embedding
+            return embeddings
+
+    async def _aembed_uncached(self, texts: List[str]) -> List[np.ndarray]:
+        chunks = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        embeddings = []
+        for vectors in await asyncio.gather(*(self._acreate(chunk) for chunk in chunks)):
+            embeddings.extend(vectors)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put_many, texts, embeddings)
+        return embeddings
+
+    async def _acreate(self, texts: List[str]) -> List[np.ndarray]:
+        logging.info(f"Embedding {len(texts)} texts")
+        params = self._params(texts)
+        tokens = estimate_tokens(params["input"])
+        for attempt in range(self.max_retries + 1):
+            wait = self.rate_limiter.reserve(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                data = (await self.client.embeddings.create(**params)).data
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.rate_limiter.backoff(retry_after_seconds(e))
+        self.rate_limiter.success()
+        return self._vectors(data)
 
 # 创建全局函数
+@lru_cache(maxsize=1)
+def get_rate_limiter():
+    """获取全局限流器, 同步与异步客户端共用"""
+    return TokenBucketRateLimiter(
+        requests_per_second=config.embedding_requests_per_second,
+        tokens_per_minute=config.embedding_tokens_per_minute,
+    )
+
+# 嵌入后端注册表: name -> (同步工厂, 异步工厂)
+_BACKENDS = {}
+
+def register_backend(name, factory, async_factory=None):
+    """
+    Register an embedding backend selectable through EMBEDDING_BACKEND.
+
+    Args:
+        name (str): Backend name used in config.
+        factory: Callable returning an object with embed()/embed_many().
+        async_factory: Callable returning an object with aembed()/aembed_many();
+            when None the sync instance is reused and must implement both.
+    """
+    _BACKENDS[name] = (factory, async_factory)
+
+def _get_backend(name):
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}', available: {sorted(_BACKENDS)}")
+    return _BACKENDS[name]
+
+register_backend("openai", OpenAIEmbedding, AsyncOpenAIEmbedding)
+register_backend("hash", HashingEmbedding)
+
 @lru_cache(maxsize=1)
 def get_embedding_client():
     """获取嵌入客户端（带缓存）"""
-    return OpenAIEmbedding()
+    factory, _ = _get_backend(config.embedding_backend)
+    return factory()
+
+@lru_cache(maxsize=1)
+def get_async_embedding_client():
+    """获取异步嵌入客户端（带缓存）"""
+    _, async_factory = _get_backend(config.embedding_backend)
+    if async_factory is None:
+        return get_embedding_client()
+    return async_factory()
+
+def embedding_model_name():
+    """当前后端实际使用的模型名, 用于校验持久化的向量是否仍然有效"""
+    return getattr(get_embedding_client(), "model", config.embedding_model)
 
 def embed(text):
     """全局嵌入函数"""
     client = get_embedding_client()
     return client.embed(text)
 
+def embed_many(texts):
+    """全局批量嵌入函数"""
+    client = get_embedding_client()
+    return client.embed_many(texts)
+
+async def aembed(text):
+    """全局异步嵌入函数"""
+    client = get_async_embedding_client()
+    return await client.aembed(text)
+
+async def aembed_many(texts):
+    """全局异步批量嵌入函数"""
+    client = get_async_embedding_client()
+    return await client.aembed_many(texts)
+
 # 可以直接导入和使用
 # from your_module import embed
-# result = embed("hello world")
\ No newline at end of file
+# result = embed("hello world")
+# results = embed_many(["hello", "world"])
+# result = await aembed("hello world")
@@ -0,0 +1,114 @@
+import time
+import logging
+import threading
+from typing import Optional
+
+
+class TokenBucketRateLimiter:
+    """
+    Token-bucket limiter for embedding requests.
+
+    Two buckets are kept: one for requests per second and one for input tokens
+    per minute; a rate of 0 disables that bucket. reserve() never blocks, it
+    books capacity and returns how long the caller must wait, so the same limiter
+    serves both time.sleep and asyncio.sleep callers.
+
+    When the provider pushes back (HTTP 429 or a timeout) backoff() pauses all
+    callers, honoring Retry-After when given, and halves the request rate. Each
+    success then restores a little of the configured rate.
+    """
+
+    def __init__(self, requests_per_second: float = 0.0, tokens_per_minute: float = 0.0,
+                 min_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.requests_per_second = float(requests_per_second)
+        self.tokens_per_minute = float(tokens_per_minute)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._rate_factor = 1.0
+        self._request_tokens = max(self.requests_per_second, 1.0)
+        self._input_tokens = self.tokens_per_minute
+        self._updated = now
+        self._paused_until = now
+        self._consecutive_failures = 0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_second > 0:
+            rate = self.requests_per_second * self._rate_factor
+            self._request_tokens = min(max(self.requests_per_second, 1.0),
+                                       self._request_tokens + elapsed * rate)
+        if self.tokens_per_minute > 0:
+            self._input_tokens = min(self.tokens_per_minute,
+                                     self._input_tokens + elapsed * self.tokens_per_minute / 60.0)
+
+    def reserve(self, tokens: int = 1) -> float:
+        """Book one request carrying `tokens` input tokens; return seconds to wait first."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self._paused_until - now)
+            if self.requests_per_second > 0:
+                self._request_tokens -= 1
+                if self._request_tokens < 0:
+                    rate = self.requests_per_second * self._rate_factor
+                    wait = max(wait, -self._request_tokens / rate)
+            if self.tokens_per_minute > 0:
+                # a single oversized request may drain the bucket, it just waits longer
+                self._input_tokens -= tokens
+                if self._input_tokens < 0:
+                    wait = max(wait, -self._input_tokens * 60.0 / self.tokens_per_minute)
+            return wait
+
+    def acquire(self, tokens: int = 1):
+        """Blocking variant of reserve()."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    def backoff(self, retry_after: Optional[float] = None) -> float:
+        """Pause every caller after a 429, timeout, connection error or 5xx; return the pause in seconds."""
+        with self._lock:
+            self._consecutive_failures += 1
+            if retry_after is None:
+                delay = min(self.max_backoff, self.min_backoff * 2 ** (self._consecutive_failures - 1))
+            else:
+                delay = min(self.max_backoff, max(0.0, retry_after))
+            self._rate_factor = max(0.05, self._rate_factor / 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            logging.warning(f"Embedding provider pushed back, pausing {delay:.2f}s "
+                            f"(rate factor {self._rate_factor:.2f})")
+            return delay
+
+    def success(self):
+        """Recover the configured rate step by step after the provider accepts requests."""
+        with self._lock:
+            self._consecutive_failures = 0
+            if self._rate_factor < 1.0:
+                self._rate_factor = min(1.0, self._rate_factor + 0.1)
+
+
+def estimate_tokens(texts) -> int:
+    """Rough input token count, ~4 bytes of UTF-8 per token."""
+    return sum(max(1, len(text.encode("utf-8")) // 4) for text in texts)
+
+
+def retry_after_seconds(error) -> Optional[float]:
+    """Read Retry-After (or retry-after-ms) from an openai APIStatusError, if present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms is not None:
+            return float(retry_after_ms) / 1000.0
+        retry_after = headers.get("retry-after")
+        if retry_after is not None:
+            return float(retry_after)
+    except (TypeError, ValueError):
+        # HTTP-date form of Retry-After, fall back to exponential backoff
+        return None
+    return None
@@ -0,0 +1,77 @@
+"""
+Compiled-callable cache for capability implementations.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from scl.otel.otel import cap_compile_cache_hit_counter, cap_compile_cache_miss_counter
+from scl.executor.source import impl_hash, compile_function
+
+
+class CompiledCapCache:
+    """
+    LRU cache of compiled capability functions.
+
+    Entries are keyed by (capability name, sha256 of function_impl, argument
+    names). Argument names are sorted because the function is always called with
+    keyword arguments. When a capability shows up with a different
+    function_impl, the entries compiled from its previous implementation are
+    dropped, so an updated tool never runs stale code and never leaks entries.
+    """
+
+    def __init__(self, max_entries: int = 256, namespace: Optional[dict] = None):
+        self.max_entries = max(1, int(max_entries))
+        self.namespace = namespace if namespace is not None else {}
+        self._entries: "OrderedDict[Tuple[str, str, Tuple[str, ...]], Callable]" = OrderedDict()
+        # capability name -> hash of the implementation currently cached for it
+        self._impl_hashes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _invalidate_locked(self, name: str):
+        for key in [key for key in self._entries if key[0] == name]:
+            del self._entries[key]
+        self._impl_hashes.pop(name, None)
+
+    def invalidate(self, name: Optional[str] = None):
+        """Drop the entries of one capability, or everything."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+                self._impl_hashes.clear()
+            else:
+                self._invalidate_locked(name)
+
+    def get(self, name: str, function_impl: str, arg_names: Iterable[str]) -> Callable:
+        digest = impl_hash(function_impl)
+        key = (name, digest, tuple(sorted(arg_names)))
+        with self._lock:
+            func = self._entries.get(key)
+            if func is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                cap_compile_cache_hit_counter.add(1, {"name": name})
+                return func
+            if self._impl_hashes.get(name, digest) != digest:
+                logging.info(f"Implementation of {name} changed, dropping its compiled functions")
+                self._invalidate_locked(name)
+        # compile outside the lock; a concurrent miss on the same key just compiles twice
+        func = compile_function(name, function_impl, key[2], self.namespace)
+        with self._lock:
+            self.misses += 1
+            cap_compile_cache_miss_counter.add(1, {"name": name})
+            if self._impl_hashes.get(name, digest) != digest:
+                self._invalidate_locked(name)
+            self._entries[key] = func
+            self._entries.move_to_end(key)
+            self._impl_hashes[name] = digest
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                if not any(key[0] == evicted[0] for key in self._entries):
+                    self._impl_hashes.pop(evicted[0], None)
+        return func
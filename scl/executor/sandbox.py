@@ -0,0 +1,208 @@
+"""
+Process-pool executor for capability code.
+"""
+import os
+import json
+import queue
+import logging
+import threading
+import multiprocessing
+from typing import NamedTuple, Optional
+from scl.executor.worker import dumps, worker_main
+
+
+class SandboxError(RuntimeError):
+    """A capability failed inside the sandbox, or its worker died."""
+
+
+class SandboxTimeout(SandboxError):
+    """A capability exceeded its wall-clock limit and its worker was killed."""
+
+
+class _Worker(NamedTuple):
+    process: multiprocessing.Process
+    conn: object
+
+
+class ProcessSandbox:
+    """
+    Pool of pre-started worker processes that run capability function_impl code.
+
+    Each worker keeps an LRU of compiled functions, so hot tools stay warm, and
+    runs under an address-space limit (RLIMIT_AS, `memory_mb`). A call borrows
+    an idle worker and waits at most `timeout` seconds for the answer. If that
+    runs out, or the worker dies (e.g. it hit the memory limit), the worker is
+    killed and the call raises SandboxTimeout or SandboxError; a replacement
+    is started in the background. Workers count as started only once they have
+    sent a ready frame, so the pool is warm when the constructor returns.
+    The serving process never execs the untrusted code, and CPU-bound tools run
+    on as many cores as there are workers.
+
+    Requests and results are compact JSON frames over a pipe. Unlike pickle,
+    unpacking a frame from a compromised worker cannot run code in the parent.
+    Results that are not JSON values come back as str(result).
+
+    The workers start with "forkserver" where it is available and "spawn"
+    otherwise, never a plain fork of the (threaded) serving process. As with any
+    multiprocessing code, the main script needs an `if __name__ == "__main__":`
+    guard.
+    """
+
+    def __init__(self, workers: int = 0, timeout: float = 30.0, memory_mb: int = 512,
+                 cache_size: int = 256, start_method: Optional[str] = None, start_timeout: float = 60.0):
+        if not start_method:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = "forkserver" if "forkserver" in methods else "spawn"
+        self._ctx = multiprocessing.get_context(start_method)
+        self.workers = int(workers) if workers and workers > 0 else (os.cpu_count() or 1)
+        self.timeout = timeout
+        self.memory_mb = int(memory_mb)
+        self.cache_size = max(1, int(cache_size))
+        self.start_timeout = start_timeout
+        self._idle = queue.Queue()
+        self._all = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        # workers lost to a failed restart, respawned in the background
+        self._missing = 0
+        self._restoring = False
+        # start all workers at once, then wait until every one has answered
+        starting = [self._start() for _ in range(self.workers)]
+        try:
+            for worker in starting:
+                self._wait_ready(worker)
+                self._idle.put(worker)
+        except BaseException:
+            self.close()
+            raise
+        logging.info(f"Started {self.workers} sandbox workers ({start_method}, "
+                     f"timeout={timeout}s, memory={self.memory_mb}MB)")
+
+    def _start(self) -> _Worker:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=worker_main, args=(child_conn, self.memory_mb, self.cache_size),
+                                    name="scl-sandbox", daemon=True)
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        with self._lock:
+            self._all.add(worker)
+        return worker
+
+    def _wait_ready(self, worker: _Worker):
+        """Block until the worker has finished importing and sent its ready frame."""
+        try:
+            if not worker.conn.poll(self.start_timeout):
+                raise SandboxError(f"sandbox worker did not start within {self.start_timeout}s")
+            json.loads(worker.conn.recv_bytes())["ready"]
+        except (EOFError, OSError, KeyError, ValueError) as e:
+            worker.process.join(1)
+            self._kill(worker)
+            raise SandboxError(f"sandbox worker failed to start (exit code {worker.process.exitcode}): {e}")
+        except SandboxError:
+            self._kill(worker)
+            raise
+
+    def _spawn(self) -> _Worker:
+        worker = self._start()
+        self._wait_ready(worker)
+        return worker
+
+    def _kill(self, worker: _Worker):
+        with self._lock:
+            self._all.discard(worker)
+        worker.conn.close()
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(1)
+
+    def _replace(self, worker: _Worker):
+        self._kill(worker)
+        with self._lock:
+            self._missing += 1
+        self._schedule_restore()
+
+    def _schedule_restore(self):
+        # the replacement boots in the background, the failed call returns right away
+        with self._lock:
+            if self._restoring or not self._missing or self._closed:
+                return
+            self._restoring = True
+        threading.Thread(target=self._restore, name="scl-sandbox-restart", daemon=True).start()
+
+    def _restore(self):
+        try:
+            while True:
+                with self._lock:
+                    if self._closed or not self._missing:
+                        return
+                try:
+                    worker = self._spawn()
+                except Exception as e:
+                    # retried on the next call
+                    logging.error(f"Failed to restart a sandbox worker: {e}")
+                    return
+                with self._lock:
+                    self._missing -= 1
+                if self._closed:
+                    self._kill(worker)
+                    return
+                self._idle.put(worker)
+        finally:
+            with self._lock:
+                self._restoring = False
+
+    def _acquire(self, name: str, timeout: float) -> _Worker:
+        if self._missing:
+            self._schedule_restore()
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise SandboxTimeout(f"no sandbox worker was free for {name} within {timeout}s "
+                                 f"({self._missing} of {self.workers} restarting)")
+        if worker is None:
+            # close() wakes waiters with a sentinel, pass it on to the next one
+            self._idle.put(None)
+            raise SandboxError("sandbox is closed")
+        return worker
+
+    def call(self, name: str, function_impl: str, args: Optional[dict] = None, timeout: Optional[float] = None):
+        """
+        Run one capability with keyword arguments in a worker and return its result.
+
+        Waiting for a free worker and running the call are each bounded by `timeout`.
+
+        Raises:
+            SandboxTimeout: no worker became free, or the call ran longer than
+                `timeout` (default: the pool's)
+            SandboxError: the capability raised, its worker died, or the sandbox is closed
+        """
+        if self._closed:
+            raise SandboxError("sandbox is closed")
+        timeout = self.timeout if timeout is None else timeout
+        request = dumps({"name": name, "impl": function_impl or "", "args": args or {}})
+        worker = self._acquire(name, timeout)
+        try:
+            worker.conn.send_bytes(request)
+            if not worker.conn.poll(timeout):
+                self._replace(worker)
+                raise SandboxTimeout(f"{name} did not finish within {timeout}s")
+            response = json.loads(worker.conn.recv_bytes())
+        except (EOFError, OSError) as e:
+            worker.process.join(1)
+            exitcode = worker.process.exitcode
+            self._replace(worker)
+            raise SandboxError(f"sandbox worker running {name} died (exit code {exitcode}): {e}")
+        self._idle.put(worker)
+        if "error" in response:
+            raise SandboxError(f"{name} raised {response['error']}: {response['message']}")
+        return response["ok"] if "ok" in response else response["str"]
+
+    def close(self):
+        """Stop all workers; calls still running are cut off and waiting callers get SandboxError."""
+        self._closed = True
+        with self._lock:
+            workers = list(self._all)
+        for worker in workers:
+            self._kill(worker)
+        self._idle.put(None)
@@ -0,0 +1,32 @@
+"""
+Turn a capability's function_impl into a callable.
+
+Standard library only, so sandbox worker processes can import it without
+pulling in telemetry or storage modules.
+"""
+import hashlib
+import logging
+from typing import Callable, Iterable
+
+FUNC_NAME = "dynamic_func"
+
+
+def impl_hash(function_impl: str) -> str:
+    return hashlib.sha256((function_impl or "").encode("utf-8")).hexdigest()
+
+
+def build_source(function_impl: str, arg_names: Iterable[str]) -> str:
+    """Wrap a function_impl body into `def dynamic_func(<args>):`."""
+    func_lines = [f"def {FUNC_NAME}({', '.join(arg_names)}):"]
+    func_lines.extend([f"    {line}" for line in (function_impl or "").split('\n')])
+    return '\n'.join(func_lines)
+
+
+def compile_function(name: str, function_impl: str, arg_names: Iterable[str], namespace: dict) -> Callable:
+    """exec the wrapped body in `namespace` and return the resulting function."""
+    func_def = build_source(function_impl, arg_names)
+    logging.debug(f"compiling {name}: {func_def}")
+    code = compile(func_def, f"<capability {name}>", "exec")
+    local_vars = {}
+    exec(code, namespace, local_vars)
+    return local_vars[FUNC_NAME]
@@ -0,0 +1,69 @@
+"""
+Entry point of a sandbox worker process (see scl.executor.sandbox).
+
+Imports only the standard library and scl.executor.source, so starting a
+worker stays cheap and does not start telemetry exporters.
+"""
+import os
+import sys
+import json
+import signal
+import logging
+from collections import OrderedDict
+from scl.executor.source import impl_hash, compile_function
+
+
+def dumps(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _limit_memory(memory_mb: int):
+    if memory_mb <= 0:
+        return
+    try:
+        import resource
+    except ImportError:
+        # not available on Windows, the wall-clock limit still applies
+        return
+    limit = int(memory_mb) * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _encode_result(result) -> bytes:
+    try:
+        return dumps({"ok": result})
+    except (TypeError, ValueError):
+        # the caller only formats tool output as text, so str() loses nothing it uses
+        return dumps({"str": str(result)})
+
+
+def worker_main(conn, memory_mb: int, cache_size: int):
+    """Serve requests from `conn` until the parent closes it."""
+    # Ctrl-C is handled by the parent, which then stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _limit_memory(memory_mb)
+    compiled = OrderedDict()
+    # the modules call_cap_safe exposed to inline tools
+    namespace = {"os": os, "sys": sys, "logging": logging}
+    # tells the parent the worker is up (imports done), before any request is sent
+    conn.send_bytes(dumps({"ready": os.getpid()}))
+    while True:
+        try:
+            request = json.loads(conn.recv_bytes())
+        except (EOFError, OSError):
+            return
+        try:
+            name, function_impl, args = request["name"], request["impl"], request["args"]
+            key = (name, impl_hash(function_impl), tuple(sorted(args)))
+            func = compiled.get(key)
+            if func is None:
+                func = compile_function(name, function_impl, key[2], namespace)
+                compiled[key] = func
+                while len(compiled) > cache_size:
+                    compiled.popitem(last=False)
+            compiled.move_to_end(key)
+            response = _encode_result(func(**args))
+        except BaseException as e:
+            # SystemExit or MemoryError from a tool must not take the worker down
+            response = dumps({"error": type(e).__name__, "message": str(e)})
+        conn.send_bytes(response)
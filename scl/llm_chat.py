@@ -1,10 +1,116 @@
 import json
+import time
+import asyncio
+import inspect
 import logging
+import contextvars
+from functools import lru_cache
+from concurrent.futures import Executor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Tuple
 from scl.otel.otel import tracer
 from scl.cap_reg import CapRegistry
 from scl.meta.msg import Msg
 from scl.config import config
 from scl.otel.otel import cap_counts
+from scl.meta.capability import Capability
+
+
+@lru_cache(maxsize=1)
+def _retrieval_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=config.retrieval_workers, thread_name_prefix="scl-retrieval")
+
+
+@lru_cache(maxsize=1)
+def _tool_call_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=max(1, config.tool_call_workers), thread_name_prefix="scl-tool-call")
+
+
+def _retrieval_channels(cap_registry: CapRegistry, ToolNames, msg: Msg, limit, min_similarity, embedded=True):
+    channels = {"named": (cap_registry.getCapsByNames, (ToolNames,))}
+    if embedded:
+        channels["autonomy"] = (cap_registry.getCapsBySimilarity, (msg, limit, min_similarity))
+        channels["history"] = (cap_registry.getCapsByHistory, (msg, limit, min_similarity))
+    return channels
+
+
+def retrieve_caps(cap_registry: CapRegistry, ToolNames, msg: Msg, limit, min_similarity
+                  ) -> Tuple[Dict[str, Capability], Dict[str, Capability], Dict[str, Capability]]:
+    """
+    Run the named, similarity and history channels concurrently on a thread pool.
+
+    The query embedding is computed first, outside the deadline, so
+    RETRIEVAL_TIMEOUT only bounds the store round trips. A similarity or
+    history channel that fails or exceeds the timeout contributes nothing, so
+    the turn costs the slowest channel (at most the timeout) instead of their
+    sum. The named channel holds tools the caller asked for, and it is always
+    waited for.
+
+    Returns:
+        (tools_named, tools_autonomy, tools_history)
+    """
+    timeout = config.retrieval_timeout if config.retrieval_timeout > 0 else None
+    try:
+        msg.embed
+        embedded = True
+    except Exception as e:
+        logging.error(f"Embedding the query failed, retrieving named tools only: {e}")
+        embedded = False
+    pool = _retrieval_pool()
+    start = time.monotonic()
+    # copy_context keeps the current span as parent inside the worker threads
+    futures = {channel: pool.submit(contextvars.copy_context().run, fn, *args)
+               for channel, (fn, args) in _retrieval_channels(
+                   cap_registry, ToolNames, msg, limit, min_similarity, embedded).items()}
+    results = {}
+    for channel, future in futures.items():
+        remaining = None
+        if timeout is not None and channel != "named":
+            remaining = max(0.0, timeout - (time.monotonic() - start))
+        try:
+            results[channel] = future.result(timeout=remaining) or {}
+        except FutureTimeoutError:
+            logging.warning(f"Retrieval channel '{channel}' timed out after {timeout}s, continuing without it")
+        except Exception as e:
+            logging.error(f"Retrieval channel '{channel}' failed: {e}")
+    return tuple(results.get(channel, {}) for channel in ("named", "autonomy", "history"))
+
+
+async def aretrieve_caps(cap_registry: CapRegistry, ToolNames, msg: Msg, limit, min_similarity
+                         ) -> Tuple[Dict[str, Capability], Dict[str, Capability], Dict[str, Capability]]:
+    """
+    asyncio variant of retrieve_caps, combined with asyncio.gather.
+
+    Coroutine channels are awaited directly and sync ones run on the retrieval pool.
+    As in retrieve_caps, the query is embedded before the deadline starts and
+    the named channel is not timed out. A timed-out sync call is abandoned, not
+    interrupted.
+    """
+    timeout = config.retrieval_timeout if config.retrieval_timeout > 0 else None
+    loop = asyncio.get_running_loop()
+    try:
+        await msg.aget_embed()
+        embedded = True
+    except Exception as e:
+        logging.error(f"Embedding the query failed, retrieving named tools only: {e}")
+        embedded = False
+
+    async def run(channel, fn, args):
+        if inspect.iscoroutinefunction(fn):
+            pending = fn(*args)
+        else:
+            pending = loop.run_in_executor(_retrieval_pool(), contextvars.copy_context().run, fn, *args)
+        try:
+            return await asyncio.wait_for(pending, None if channel == "named" else timeout) or {}
+        except asyncio.TimeoutError:
+            logging.warning(f"Retrieval channel '{channel}' timed out after {timeout}s, continuing without it")
+        except Exception as e:
+            logging.error(f"Retrieval channel '{channel}' failed: {e}")
+        return {}
+
+    channels = _retrieval_channels(cap_registry, ToolNames, msg, limit, min_similarity, embedded)
+    results = dict(zip(channels, await asyncio.gather(*(run(channel, fn, args)
+                                                         for channel, (fn, args) in channels.items()))))
+    return tuple(results.get(channel, {}) for channel in ("named", "autonomy", "history"))
 
 ## why not we just prvide the metrics and leave the function to user themself?
 ## using hooks to provide user capbility to overwrite the default behavior
@@ -28,15 +134,9 @@ def send_messages(
         limit = config.limit
         ### hook of overwrite min_similarity
         min_similarity = config.min_similarity
-        tools_named = cap_registry.getCapsByNames(ToolNames)
-        ## metrics 
-        ### search time,search number
-        ### a key-value cache for information
-        tools_autonomy = cap_registry.getCapsBySimilarity(msg, limit, min_similarity)
-        ## metrics 
-        ### search time,search number
-        ### a key-value cache for information
-        tools_history = cap_registry.getCapsByHistory(msg, limit, min_similarity)
+        ## named, similarity and history retrieval run concurrently
+        tools_named, tools_autonomy, tools_history = retrieve_caps(
+            cap_registry, ToolNames, msg, limit, min_similarity)
         ## metrics 
         ### search time,search number
         ### a key-value cache for information
@@ -76,12 +176,48 @@ def send_messages(
                 )
         return response.choices[0].message
 
+def _run_tool_call(cap_registry: CapRegistry, msg: Msg, cap: Capability, args_dict):
+    func1_out = cap_registry.call_cap_safe(cap,args_dict)
+    ## metric execution time
+    cap_registry.record(msg, cap)
+    return func1_out
+
+
+def run_tool_calls(cap_registry: CapRegistry, msg: Msg, tool_calls, executor: Executor = None) -> list:
+    """
+    Execute the tool calls of one response concurrently.
+
+    Names are resolved with one getCapsByNames call and each call (execute, then
+    record) runs on `executor`, by default a shared pool of TOOL_CALL_WORKERS
+    threads. Results come back in tool_calls order; the first failing call, in
+    that order, raises.
+    """
+    parsed = []
+    for tool_call in tool_calls:
+        ## metric accuery for each search? from LLM, back to cap_reg's cache
+        func1_name = tool_call.function.name
+        func1_args = tool_call.function.arguments
+        ## todo-> debug/trace
+        logging.info(f"func1_name: {func1_name}, func1_args: {func1_args}")
+        parsed.append((func1_name, json.loads(func1_args)))
+    caps = cap_registry.getCapsByNames([name for name, _ in parsed])
+    if len(parsed) == 1 or (executor is None and config.tool_call_workers <= 1):
+        return [_run_tool_call(cap_registry, msg, caps.get(name), args_dict) for name, args_dict in parsed]
+    executor = executor or _tool_call_pool()
+    # copy_context keeps the current span as parent inside the worker threads
+    futures = [executor.submit(contextvars.copy_context().run, _run_tool_call,
+                               cap_registry, msg, caps.get(name), args_dict)
+               for name, args_dict in parsed]
+    return [future.result() for future in futures]
+
+
 @tracer.start_as_current_span("function_call_playground")
 def function_call_playground(
     client, model, 
     cap_registry:CapRegistry,
     ToolNames,
     msg:Msg,
+    executor: Executor = None,
     ): 
     turns = 0
     ## metric execution time
@@ -92,19 +228,11 @@ def function_call_playground(
     logging.info(response)
     if response.tool_calls:
         cap_counts["hit"] = len(response.tool_calls)
-        for tool_call in response.tool_calls:
-            ## metric accuery for each search? from LLM, back to cap_reg's cache
-            func1_name = tool_call.function.name
-            func1_args = tool_call.function.arguments
-            ## todo-> debug/trace
-            logging.info(f"func1_name: {func1_name}, func1_args: {func1_args}")
-            args_dict = json.loads(func1_args)
-            cap = cap_registry.get_cap_by_name(func1_name)
-            func1_out = cap_registry.call_cap_safe(cap,args_dict)
-            ## metric execution time
-            cap_registry.record(msg, cap)
-
-            msg.append(response)
+        ## independent tool calls run concurrently, results keep tool_calls order
+        outputs = run_tool_calls(cap_registry, msg, response.tool_calls, executor)
+        ## one assistant message carrying all tool_calls, then one result per call
+        msg.append(response)
+        for tool_call, func1_out in zip(response.tool_calls, outputs):
             msg.append_cap_result(func1_out, tool_call.id)
         ## metric execution time
         response = send_messages(client, model, cap_registry, ToolNames, msg, turns)
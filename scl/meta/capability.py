@@ -1,6 +1,7 @@
+import numpy as np
 from abc import ABC, abstractmethod
-from typing import Optional, Dict
-from scl.embeddings.impl import embed
+from typing import Optional, Dict, Iterable
+from scl.embeddings.impl import embed, embed_many, as_embedding
 
 
 class Capability(ABC):
@@ -8,17 +9,20 @@ class Capability(ABC):
     Abstract base class for Skill and FunctionCall classes.
     Provides a common interface for both skill-based and function call-based implementations.
     """
-    
+    __slots__ = ("_name", "_description", "_embedding_description", "_original_body",
+                 "_type", "_llm_description", "_function_impl")
+
     def __init__(self,
                  name: str,
                  type: str,
                  description: Optional[str] = None,
                  original_body: Optional[str] = None,
                  llm_description: Optional[str] = None,
-                 function_impl: Optional[str] = None):
+                 function_impl: Optional[str] = None,
+                 embedding_description=None):
         self._name = name
         self._description = description
-        self._embedding_description = None
+        self._embedding_description = as_embedding(embedding_description)
         self._original_body = original_body
         self._type = type
         self._llm_description = llm_description
@@ -40,12 +44,22 @@ class Capability(ABC):
         return self._original_body
 
     @property
-    def embedding_description(self):
-        """函数描述 实际用于RAG渐进式加载"""
+    def embedding_description(self) -> np.ndarray:
+        """函数描述 实际用于RAG渐进式加载(float32向量)"""
         if self._embedding_description is None:
-            self._embedding_description = embed(self._description)
+            self._embedding_description = as_embedding(embed(self._description))
         return self._embedding_description
 
+    @staticmethod
+    def prefetch_embeddings(caps: Iterable["Capability"]):
+        """批量计算尚未嵌入的描述, 一次embed_many代替逐个embed"""
+        pending = [cap for cap in caps if cap._embedding_description is None]
+        if not pending:
+            return
+        embeddings = embed_many([cap._description for cap in pending])
+        for cap, embedding in zip(pending, embeddings):
+            cap._embedding_description = as_embedding(embedding)
+
     @property
     def type(self) -> str:
         """实现类型"""
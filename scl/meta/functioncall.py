@@ -3,10 +3,15 @@ from scl.embeddings.impl import embed
 from scl.meta.capability import Capability
 
 class FunctionCall(Capability):
+    __slots__ = ()
+
     def __init__(self, 
                  name: str, 
                  description: str, 
                  original_body: str, 
                  llm_description: Optional[str] = None,
-                 function_impl: Optional[str] = None):
-        super().__init__(name, description, original_body, "function_call", llm_description, function_impl)
\ No newline at end of file
+                 function_impl: Optional[str] = None,
+                 embedding_description=None):
+        super().__init__(name=name, type="function_call", description=description,
+                         original_body=original_body, llm_description=llm_description,
+                         function_impl=function_impl, embedding_description=embedding_description)
\ No newline at end of file
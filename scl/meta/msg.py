@@ -1,9 +1,49 @@
-from scl.embeddings.impl import embed
+import threading
+from scl.config import config
+from scl.embeddings.impl import embed, aembed, as_embedding
+
+MSG_EMBED_POLICIES = ("first", "last_user", "last_n_user")
+
+def _field(message, key):
+    # messages may be plain dicts or ChatCompletionMessage objects appended from responses
+    if isinstance(message, dict):
+        return message.get(key)
+    return getattr(message, key, None)
+
+def _text(content) -> str:
+    if isinstance(content, list):
+        # multimodal content, keep only the text parts
+        return " ".join(part.get("text", "") for part in content
+                        if isinstance(part, dict) and part.get("type") == "text")
+    return content or ""
 
 class Msg:
-    def __init__(self, messages):
+    def __init__(self, messages, embedding=None, policy=None, turns=None):
         self._messages = messages
-        self._embed = embed(messages[0]['content'])
+        self._policy = policy or config.msg_embed_policy
+        if self._policy not in MSG_EMBED_POLICIES:
+            raise ValueError(f"Unknown msg embed policy '{self._policy}', expected one of {MSG_EMBED_POLICIES}")
+        self._turns = max(1, turns or config.msg_embed_turns)
+        # 延迟到第一次访问embed时才计算
+        self._embed = as_embedding(embedding)
+        self._embed_lock = threading.Lock()
+
+    @classmethod
+    async def create(cls, messages, policy=None, turns=None):
+        """异步构造Msg, 嵌入计算不阻塞事件循环"""
+        msg = cls(messages, policy=policy, turns=turns)
+        msg._embed = await aembed(msg.query_text())
+        return msg
+
+    def query_text(self) -> str:
+        """按嵌入策略选出用于检索的文本"""
+        if self._policy != "first":
+            user_turns = [_text(_field(m, "content")) for m in self._messages if _field(m, "role") == "user"]
+            user_turns = [turn for turn in user_turns if turn]
+            if user_turns:
+                count = 1 if self._policy == "last_user" else self._turns
+                return "\n".join(user_turns[-count:])
+        return _text(_field(self._messages[0], "content"))
 
     def append(self, context):
         self._messages.append(context)
@@ -19,6 +59,20 @@ class Msg:
     def messages(self):
         return self._messages
 
+    async def aget_embed(self):
+        """embed的异步版本, 已计算过则直接返回"""
+        if self._embed is None:
+            embedding = await aembed(self.query_text())
+            with self._embed_lock:
+                if self._embed is None:
+                    self._embed = embedding
+        return self._embed
+
     @property
     def embed(self):
+        if self._embed is None:
+            # retrieval channels may read this concurrently, embed only once
+            with self._embed_lock:
+                if self._embed is None:
+                    self._embed = embed(self.query_text())
         return self._embed
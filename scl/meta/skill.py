@@ -9,8 +9,11 @@ from scl.meta.skills_ref.parser import SkillProperties
 from scl.meta.capability import Capability
 
 class Skill(Capability):
+    __slots__ = ("_original_body_dict",)
+
     def __init__(self, 
-                 SkillProperties: SkillProperties):
+                 SkillProperties: SkillProperties,
+                 embedding_description=None):
         if SkillProperties.metadata:
             self._original_body_dict = SkillProperties.metadata.copy()
         else:
@@ -23,7 +26,8 @@ class Skill(Capability):
             original_body=original_body,
             type="skill",
             llm_description=None,  # tbd
-            function_impl=None    # tbd
+            function_impl=None,    # tbd
+            embedding_description=embedding_description
         )
 
     @property
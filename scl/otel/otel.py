@@ -88,6 +88,36 @@ tool_execute_time_histogram = meter.create_histogram(
     unit="s"
 )
 
+ingest_stage_time_histogram = meter.create_histogram(
+    name="cap_ingest_stage_time",
+    description="Time taken by each stage of skill ingestion",
+    unit="s"
+)
+
+embedding_cache_hit_counter = meter.create_counter(
+    name="embedding_cache_hit",
+    description="Embeddings served from the local embedding cache",
+    unit="1"
+)
+
+embedding_cache_miss_counter = meter.create_counter(
+    name="embedding_cache_miss",
+    description="Embeddings not found in the local embedding cache",
+    unit="1"
+)
+
+cap_compile_cache_hit_counter = meter.create_counter(
+    name="cap_compile_cache_hit",
+    description="Capability calls served by an already compiled function",
+    unit="1"
+)
+
+cap_compile_cache_miss_counter = meter.create_counter(
+    name="cap_compile_cache_miss",
+    description="Capability calls that had to compile function_impl",
+    unit="1"
+)
+
 # Dictionary to store counts
 cap_counts = {
     "search": 0,
@@ -107,3 +137,19 @@ cap_gauge = meter.create_observable_gauge(
     description="gauge related with cap",
     unit="1"
 )
+
+# (cache name, "exact" | "near" | "miss") -> lookups, filled by scl.semcache.SemanticCache
+semantic_cache_counts = {}
+
+def observable_semantic_cache_func(options: CallbackOptions) -> Iterable[Observation]:
+    for cache_name in {name for name, _ in list(semantic_cache_counts)}:
+        hits = semantic_cache_counts.get((cache_name, "exact"), 0) + semantic_cache_counts.get((cache_name, "near"), 0)
+        total = hits + semantic_cache_counts.get((cache_name, "miss"), 0)
+        yield Observation(hits / total if total else 0.0, {"cache": cache_name})
+
+semantic_cache_hit_ratio_gauge = meter.create_observable_gauge(
+    name="cap_semantic_cache_hit_ratio",
+    callbacks=[observable_semantic_cache_func],
+    description="Share of retrieval lookups answered by the semantic result cache",
+    unit="1"
+)
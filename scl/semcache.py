@@ -0,0 +1,132 @@
+"""
+Cache of retrieval results keyed by query embedding.
+"""
+import time
+import hashlib
+import threading
+import numpy as np
+from typing import Dict, Hashable, Optional
+from scl.meta.capability import Capability
+from scl.storage.vecindex import normalize_rows
+from scl.otel.otel import semantic_cache_counts
+
+# normalized components are rounded to multiples of 1/QUANT_SCALE before hashing
+QUANT_SCALE = 4096
+
+
+class SemanticCache:
+    """
+    TTL + LRU cache of {name: Capability} results for near-duplicate queries.
+
+    Query embeddings are L2-normalized into a preallocated float32 matrix. An
+    exact hit is a dict lookup on the hash of the quantized vector, so a repeated
+    question (or one that differs only by float noise) costs one hash. Otherwise
+    one matrix-vector product over the live slots finds the closest cached query,
+    and its result is reused if the cosine distance is at most `radius`. Entries
+    are scoped by a key (for example limit and min_similarity), and only entries
+    with the same scope can match.
+
+    Entries expire after `ttl` seconds. When the cache is full, an expired slot
+    or else the least recently used one is overwritten. Call clear() when the
+    catalog changes.
+    """
+
+    def __init__(self, capacity: int, ttl: float = 300.0, radius: float = 0.02, name: str = "similarity"):
+        self.capacity = max(1, int(capacity))
+        self.ttl = float(ttl)
+        self.radius = float(radius)
+        self.name = name
+        self._vectors = None  # allocated on first put, once dims is known
+        self._expires = np.zeros(self.capacity, dtype=np.float64)
+        self._last_used = np.zeros(self.capacity, dtype=np.float64)
+        self._scopes = np.full(self.capacity, -1, dtype=np.int64)
+        self._hashes = [None] * self.capacity
+        self._values = [None] * self.capacity
+        self._by_hash: Dict[bytes, int] = {}
+        self._scope_ids: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.hits = {"exact": 0, "near": 0}
+        self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits["exact"] + self.hits["near"] + self.misses
+        return (self.hits["exact"] + self.hits["near"]) / total if total else 0.0
+
+    def _hash(self, vector: np.ndarray, scope_id: int) -> bytes:
+        quantized = np.round(vector * QUANT_SCALE).astype(np.int16)
+        return hashlib.blake2b(quantized.tobytes() + scope_id.to_bytes(8, "little"), digest_size=16).digest()
+
+    def _count(self, result: str):
+        if result == "miss":
+            self.misses += 1
+        else:
+            self.hits[result] += 1
+        semantic_cache_counts[(self.name, result)] = semantic_cache_counts.get((self.name, result), 0) + 1
+
+    def _hit(self, slot: int, now: float, kind: str) -> Dict[str, Capability]:
+        self._last_used[slot] = now
+        self._count(kind)
+        return dict(self._values[slot])
+
+    def get(self, embedding, scope: Hashable = None) -> Optional[Dict[str, Capability]]:
+        """Cached result for this query, or None."""
+        vector = normalize_rows(embedding)[0]
+        now = time.monotonic()
+        with self._lock:
+            scope_id = self._scope_ids.get(scope)
+            if scope_id is None or self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+                self._count("miss")
+                return None
+            slot = self._by_hash.get(self._hash(vector, scope_id))
+            if slot is not None and self._expires[slot] > now:
+                return self._hit(slot, now, "exact")
+            if self.radius > 0:
+                live = np.flatnonzero((self._expires > now) & (self._scopes == scope_id))
+                if live.size:
+                    scores = self._vectors[live] @ vector
+                    best = int(np.argmax(scores))
+                    if 1.0 - scores[best] <= self.radius:
+                        return self._hit(int(live[best]), now, "near")
+            self._count("miss")
+            return None
+
+    def put(self, embedding, result: Dict[str, Capability], scope: Hashable = None):
+        vector = normalize_rows(embedding)[0]
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+                self._clear_locked(dims=vector.shape[0])
+            scope_id = self._scope_ids.setdefault(scope, len(self._scope_ids))
+            digest = self._hash(vector, scope_id)
+            slot = self._by_hash.get(digest)
+            if slot is None:
+                expired = np.flatnonzero(self._expires <= now)
+                slot = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+                if self._hashes[slot] is not None:
+                    self._by_hash.pop(self._hashes[slot], None)
+            self._vectors[slot] = vector
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._scopes[slot] = scope_id
+            self._hashes[slot] = digest
+            self._values[slot] = dict(result)
+            self._by_hash[digest] = slot
+
+    def _clear_locked(self, dims: Optional[int] = None):
+        if dims is not None:
+            self._vectors = np.zeros((self.capacity, dims), dtype=np.float32)
+        self._expires[:] = 0
+        self._last_used[:] = 0
+        self._scopes[:] = -1
+        self._hashes = [None] * self.capacity
+        self._values = [None] * self.capacity
+        self._by_hash.clear()
+
+    def clear(self):
+        with self._lock:
+            self._clear_locked()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(np.count_nonzero(self._expires > time.monotonic()))
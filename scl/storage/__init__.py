@@ -3,8 +3,9 @@ Storage interface for function/skill storage implementations.
 """
 
 from .base import StoreBase
+from .cachedstore import CachedStore
 
-__all__ = ['StoreBase']
+__all__ = ['StoreBase', 'CachedStore']
 
 # Import PgVectorStore (PostgreSQL with pgvector)
 try:
@@ -20,6 +21,13 @@ try:
 except ImportError:
     pass
 
+# Import ShardedFsStore (file system storage over several skill roots)
+try:
+    from .shardedstore import ShardedFsStore
+    __all__.append('ShardedFsStore')
+except ImportError:
+    pass
+
 # Import OceanBaseStore (OceanBase with pyobvector)
 try:
     from .oceanbasestore import OceanBaseStore
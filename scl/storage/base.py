@@ -4,7 +4,24 @@ from scl.meta.capability import Capability
 from typing import Dict
 
 class StoreBase(ABC):
-    
+    # bumped whenever capabilities are inserted or changed, result caches compare against it
+    _catalog_version = 0
+
+    def catalog_version(self) -> int:
+        """
+        Version of the capability catalog.
+
+        Any change to the set of capabilities or to their content must change it,
+        so cached search results can be dropped.
+
+        Returns:
+            int that changes whenever the catalog changes
+        """
+        return self._catalog_version
+
+    def bump_catalog_version(self):
+        self._catalog_version += 1
+
     @abstractmethod
     def get_cap_by_name(self, name) -> Capability:
         """
@@ -18,6 +35,37 @@ class StoreBase(ABC):
         """
         pass
     
+    def get_caps_by_names(self, names) -> Dict[str, Capability]:
+        """
+        Retrieve many capabilities by name.
+
+        Stores should override this with a single lookup (one query for SQL
+        stores); the default calls get_cap_by_name once per name.
+
+        Args:
+            names (List[str]): The names of the capabilities to retrieve
+
+        Returns:
+            Dict of name -> capability in request order, unknown names left out
+        """
+        result = {}
+        for name in names:
+            cap = self.get_cap_by_name(name)
+            if cap is not None:
+                result[name] = cap
+        return result
+
+    def lookup_caps_by_names(self, names) -> Dict[str, Capability]:
+        """
+        Same as get_caps_by_names, but a storage error is raised instead of
+        being logged and reported as "not found", so callers that remember the
+        answer (CachedStore) can tell a miss from a failure.
+
+        The default calls get_caps_by_names, which suits stores whose lookups
+        cannot fail; SQL stores override it.
+        """
+        return self.get_caps_by_names(names)
+
     @abstractmethod
     def search_by_similarity(self, msg:Msg, limit=5, min_similarity=0.5) -> Dict[str,Capability]:
         """
@@ -29,7 +77,8 @@ class StoreBase(ABC):
             min_similarity (float): Minimum similarity threshold (default 0.5)
             
         Returns:
-            List of similar items with their similarity scores
+            List of similar items with their similarity scores, or None if the
+            search failed (an empty result is {}, which callers may cache)
         """
         pass
 
@@ -58,6 +107,7 @@ class StoreBase(ABC):
             min_similarity (float): Minimum similarity threshold (default 0.5)
             
         Returns:
-            List of similar items with their similarity scores
+            List of similar items with their similarity scores, or None if the
+            search failed (an empty result is {}, which callers may cache)
         """
         pass
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""
+Read-through capability cache in front of any StoreBase.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict
+from scl.meta.capability import Capability
+from scl.meta.msg import Msg
+from scl.otel.otel import tracer
+from scl.storage.base import StoreBase
+
+# cached "no such capability"
+_MISSING = object()
+
+
+class CachedStore(StoreBase):
+    """
+    Keeps parsed Capability objects from name lookups, including negative
+    entries for names the store does not have.
+
+    The cache is dropped as soon as the wrapped store's catalog_version()
+    changes. For the SQL stores that is a counter in the database, bumped by
+    insert_capability in the same transaction, so writes from other processes
+    are seen as well. The version is read at most once per `version_interval`
+    seconds, so steady-state tool resolution never reaches the database.
+    Writes through this wrapper invalidate immediately.
+
+    Fills go through the store's lookup_caps_by_names, which raises on storage
+    errors. A failed lookup is logged and answered as "not found" for this call
+    only, so a transient database error never becomes a cached negative entry.
+
+    Searches and history are passed through unchanged, and so is any other
+    attribute of the wrapped store.
+    """
+
+    def __init__(self, store: StoreBase, max_entries: int = 1024, version_interval: float = 1.0):
+        self.store = store
+        self.max_entries = max(1, int(max_entries))
+        self.version_interval = float(version_interval)
+        self._entries: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = 0.0
+
+    def __getattr__(self, name):
+        # only called for attributes CachedStore does not define itself
+        if name == "store":
+            raise AttributeError(name)
+        return getattr(self.store, name)
+
+    def catalog_version(self) -> int:
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked >= self.version_interval:
+            version = self.store.catalog_version()
+            with self._lock:
+                if version != self._version:
+                    self._entries.clear()
+                    self._version = version
+                self._version_checked = now
+        return self._version
+
+    def invalidate(self, name=None):
+        """Drop one name, or everything."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def _put_locked(self, name, value):
+        self._entries[name] = value
+        self._entries.move_to_end(name)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_cap_by_name(self, name) -> Capability:
+        self.catalog_version()
+        with self._lock:
+            value = self._entries.get(name)
+            if value is not None:
+                self._entries.move_to_end(name)
+                return None if value is _MISSING else value
+            version = self._version
+        try:
+            cap = self.store.lookup_caps_by_names([name]).get(name)
+        except Exception as e:
+            logging.error(f"Looking up {name} failed, not caching: {e}")
+            return None
+        with self._lock:
+            # skip the fill if the catalog changed while we were reading
+            if version == self._version:
+                self._put_locked(name, _MISSING if cap is None else cap)
+        return cap
+
+    @tracer.start_as_current_span("get_caps_by_names")
+    def get_caps_by_names(self, names) -> Dict[str, Capability]:
+        self.catalog_version()
+        found, pending = {}, []
+        with self._lock:
+            for name in dict.fromkeys(names):
+                value = self._entries.get(name)
+                if value is None:
+                    pending.append(name)
+                else:
+                    self._entries.move_to_end(name)
+                    if value is not _MISSING:
+                        found[name] = value
+            version = self._version
+        if pending:
+            try:
+                loaded = self.store.lookup_caps_by_names(pending)
+            except Exception as e:
+                logging.error(f"Looking up {pending} failed, not caching: {e}")
+                return {name: found[name] for name in names if name in found}
+            with self._lock:
+                if version == self._version:
+                    for name in pending:
+                        self._put_locked(name, loaded.get(name, _MISSING))
+            found.update(loaded)
+        return {name: found[name] for name in names if name in found}
+
+    def insert_capability(self, cap: Capability):
+        result = self.store.insert_capability(cap)
+        self.invalidate()
+        self._version = None
+        return result
+
+    def insert_capabilities(self, caps, *args, **kwargs):
+        result = self.store.insert_capabilities(caps, *args, **kwargs)
+        self.invalidate()
+        self._version = None
+        return result
+
+    def search_by_similarity(self, msg: Msg, limit=5, min_similarity=0.5) -> Dict[str, Capability]:
+        return self.store.search_by_similarity(msg, limit, min_similarity)
+
+    def record(self, msg: Msg, cap: Capability):
+        return self.store.record(msg, cap)
+
+    def getCapsByHistory(self, msg: Msg, limit=5, min_similarity=0.5) -> Dict[str, Capability]:
+        return self.store.getCapsByHistory(msg, limit, min_similarity)
@@ -1,132 +1,576 @@
 from pathlib import Path
+import os
+import json
+import uuid
+import time
+import hashlib
 import logging
-import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from scl.meta.capability import Capability
-from scl.meta.skills_ref.parser import read_properties
+from scl.meta.skills_ref.parser import read_properties, find_skill_md
+from scl.meta.skills_ref.models import SkillProperties
+from scl.embeddings.impl import embedding_model_name
 from scl.storage.base import StoreBase
 from scl.meta.skill import Skill
 import numpy as np
-from scl.otel.otel import tracer
+from scl.otel.otel import tracer, ingest_stage_time_histogram
 from scl.meta.msg import Msg
-from typing import Dict
+from scl.config import config
+from scl.storage.vecindex import FlatIndex, IVFIndex, normalize_rows
+from scl.storage.vecfile import write_vector_file, open_vector_file
+from scl.storage.history import HistoryBuffer
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class _CacheView(NamedTuple):
+    """Immutable search snapshot; a refresh swaps in a new one instead of mutating it."""
+    index: FlatIndex
+    keys: List[str]
+    caps: List[Capability]
+    # approximate index over the same (list-ordered) rows, None for exact search
+    ann: Optional[IVFIndex] = None
+
+    def searcher(self):
+        return self.ann if self.ann is not None else self.index
+
 
 class fsstore(StoreBase):
-    def __init__(self, path, init):
+    def __init__(self, path, init, watch=False):
         self.path = path
-        self.cache_file = Path(self.path) / ".Capability_cache.pkl"  # Cache file path
+        # float32 matrix opened with np.memmap, plus a JSON sidecar with one entry per row
+        self.cache_file = Path(self.path) / ".Capability_cache.vec"
+        self.meta_file = Path(self.path) / ".Capability_cache.meta.json"
+        self.legacy_cache_file = Path(self.path) / ".Capability_cache.pkl"
+        self.history_file = Path(self.path) / ".Capability_history.npz"
+        # IVF centroids and list offsets for the rows of cache_file
+        self.ivf_file = Path(self.path) / ".Capability_cache.ivf.npz"
+        # key -> {"Capability", "mtime_ns", "sha256"} of the skill's SKILL.md
         self._skill_embedding_cache = {}
+        # capability name -> cache entry, kept in step with _skill_embedding_cache
+        self._name_index = {}
+        # _CacheView rebuilt lazily after the cache changes
+        self._index = None
+        self._index_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._watcher = None
+        self._watcher_stop = threading.Event()
+        self.last_refresh_stats = {}
+        # bounded invocation history, allocated on first use
+        self._history = None
+        self._history_lock = threading.Lock()
+        self._records_since_snapshot = 0
         if init:
             self.refresh_cache()
         else:
             self._load_cache_from_disk()
-            
+        if watch:
+            self.start_watcher()
+
     def cache(self):
         return self._skill_embedding_cache
 
-    def load_skill(self,item):
+    @staticmethod
+    def _build_name_index(cache) -> Dict[str, dict]:
+        name_index = {}
+        for data in cache.values():
+            # first entry wins on duplicate names, as the old linear scan did
+            name_index.setdefault(data["Capability"].name, data)
+        return name_index
+
+    def _set_cache(self, cache, view=None):
+        """Swap in a new cache together with its name index and search snapshot."""
+        name_index = self._build_name_index(cache)
+        self._skill_embedding_cache = cache
+        self._name_index = name_index
+        self._index = view
+        self.bump_catalog_version()
+
+    def _read_skill(self, item, skill_md=None):
+        """Parse one skill directory into a cache entry, or None if it is invalid."""
         try:
+            skill_md = skill_md or find_skill_md(Path(item))
+            stat = skill_md.stat()
+            digest = hashlib.sha256(skill_md.read_bytes()).hexdigest()
             skill_props = read_properties(item)
             logging.info(skill_props)
-            capability = Skill(skill_props)
-            self._skill_embedding_cache[str(item)] = {
-                    "Capability": capability
-                }
+            return {"Capability": Skill(skill_props), "mtime_ns": stat.st_mtime_ns, "sha256": digest}
         except Exception as e:
             logging.error(f"Error reading properties for {item}: {e}")
+            return None
+
+    def load_skill(self,item):
+        entry = self._read_skill(item)
+        if entry is not None:
+            old = self._skill_embedding_cache.get(str(item))
+            self._skill_embedding_cache[str(item)] = entry
+            if old is not None and self._name_index.get(old["Capability"].name) is old:
+                # the replaced entry was indexed, rebuild so duplicates resolve as before
+                self._name_index = self._build_name_index(self._skill_embedding_cache)
+            else:
+                self._name_index.setdefault(entry["Capability"].name, entry)
+            self._index = None
+            self.bump_catalog_version()
 
-    def _save_cache_to_disk(self):
-        """Save the current cache to disk"""
+    def _ann_wanted(self, count: int) -> bool:
+        return config.fsstore_ann == "ivf" and count >= max(1, config.fsstore_ann_min_size)
+
+    def _train_ann(self, keys, caps, matrix):
+        """
+        Train an IVF index and reorder the rows so every list is a contiguous slice.
+
+        Returns:
+            (keys, caps, matrix, IVFIndex) in list order
+        """
+        start = time.perf_counter()
+        order, centroids, offsets = IVFIndex.train(matrix, config.fsstore_ivf_nlist)
+        matrix = np.ascontiguousarray(matrix[order])
+        ann = IVFIndex(matrix, centroids, offsets, config.fsstore_ivf_nprobe)
+        logging.info(f"Trained IVF index with {ann.nlist} lists over {len(ann)} skills "
+                     f"in {time.perf_counter() - start:.2f}s")
+        return [keys[i] for i in order], [caps[i] for i in order], matrix, ann
+
+    def _save_cache_to_disk(self, cache) -> Optional[_CacheView]:
+        """
+        Save `cache` to disk and return its search snapshot over the mapped file.
+
+        Embeddings are written L2-normalized as one float32 matrix, skill metadata
+        to the JSON sidecar. Both carry the same matrix_id so a reader can detect
+        a pair that was not written together. With FSSTORE_ANN=ivf the rows are
+        stored in IVF list order and the centroids go to a third file.
+
+        The snapshot is not installed here; the caller swaps it in together
+        with the cache. Returns None if writing failed.
+        """
         try:
-            # Convert numpy arrays to lists for serialization
-            serializable_cache = {}
-            for path, data in self._skill_embedding_cache.items():
-                serializable_cache[path] = {
-                    "Capability": data["Capability"],
-                }
-            
-            with open(self.cache_file, "wb") as f:
-                pickle.dump(serializable_cache, f)
+            keys = list(cache.keys())
+            caps = [cache[key]["Capability"] for key in keys]
+            Capability.prefetch_embeddings(caps)
+            dims = int(config.embedding_model_dims)
+            if caps:
+                matrix = normalize_rows(np.stack([cap.embedding_description for cap in caps]))
+                dims = matrix.shape[1]
+            else:
+                matrix = np.zeros((0, dims), dtype=np.float32)
+            ann = None
+            if self._ann_wanted(len(caps)):
+                keys, caps, matrix, ann = self._train_ann(keys, caps, matrix)
+            model = embedding_model_name()
+            matrix_id = uuid.uuid4().hex
+            meta = {
+                "version": 1,
+                "model": model,
+                "dims": dims,
+                "matrix_id": matrix_id,
+                "entries": [
+                    {
+                        "key": key,
+                        "name": cap.name,
+                        "description": cap.description,
+                        "metadata": getattr(cap, "original_body_dict", {}),
+                        "mtime_ns": cache[key].get("mtime_ns"),
+                        "sha256": cache[key].get("sha256"),
+                    }
+                    for key, cap in zip(keys, caps)
+                ],
+            }
+            tmp_meta = f"{self.meta_file}.tmp.{os.getpid()}"
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            write_vector_file(self.cache_file, matrix, {"model": model, "matrix_id": matrix_id, "normalized": True})
+            os.replace(tmp_meta, self.meta_file)
+            # serve from the mapped file, so this process shares pages with other workers
+            _, mapped = open_vector_file(self.cache_file)
+            # same as a loaded cache: each skill's embedding is its row of the mapping, not a private copy
+            for row, cap in enumerate(caps):
+                cap._embedding_description = mapped[row]
+            if ann is not None:
+                ann = IVFIndex(mapped, ann.centroids, ann.offsets, ann.nprobe)
+                ann.save(self.ivf_file, matrix_id=matrix_id)
+            elif self.ivf_file.exists():
+                self.ivf_file.unlink()
+            view = _CacheView(FlatIndex(mapped, normalized=True), keys, caps, ann)
+            if ann is not None:
+                logging.info(f"IVF recall@10 with nprobe={ann.nprobe}: {self._view_recall(view):.3f}")
             logging.info(f"Cache saved to {self.cache_file}")
+            return view
         except Exception as e:
             logging.error(f"Error saving cache to disk: {e}")
-    
+            return None
+
+    def _read_cache_files(self):
+        header, matrix = open_vector_file(self.cache_file)
+        with open(self.meta_file, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("matrix_id") != header.get("matrix_id") or len(meta["entries"]) != header["count"]:
+            raise ValueError("vector file and metadata sidecar are out of sync")
+        return header, matrix, meta
+
     def _load_cache_from_disk(self):
         """Load cache from disk if it exists"""
-        if self.cache_file.exists():
-            try:
-                with open(self.cache_file, "rb") as f:
-                    serializable_cache = pickle.load(f)
-                
-                # Convert lists back to numpy arrays
-                for path, data in serializable_cache.items():
-                    self._skill_embedding_cache[path] = {
-                        "Capability": data["Capability"],
-                    }
-                logging.info(f"Cache loaded from {self.cache_file}")
-            except Exception as e:
-                logging.error(f"Error loading cache from disk: {e}")
-    
+        if not (self.cache_file.exists() and self.meta_file.exists()):
+            if self.legacy_cache_file.exists():
+                logging.warning(f"Ignoring legacy pickle cache {self.legacy_cache_file}, rebuild it with init=True")
+            return
+        try:
+            # a writer renames the two files one after the other, retry if we caught it in between
+            for attempt in range(3):
+                try:
+                    header, matrix, meta = self._read_cache_files()
+                    break
+                except ValueError:
+                    if attempt == 2:
+                        raise
+                    time.sleep(0.05)
+            model = embedding_model_name()
+            if header.get("model") != model or int(header["dims"]) != int(config.embedding_model_dims):
+                logging.warning(f"Cache {self.cache_file} was built with {header.get('model')}/{header['dims']}, "
+                                f"current model is {model}/{config.embedding_model_dims}; ignoring it")
+                return
+            cache = {}
+            for row, entry in enumerate(meta["entries"]):
+                props = SkillProperties(name=entry["name"], description=entry["description"],
+                                        metadata=entry.get("metadata") or {})
+                cache[entry["key"]] = {
+                    "Capability": Skill(props, embedding_description=matrix[row]),
+                    "mtime_ns": entry.get("mtime_ns"),
+                    "sha256": entry.get("sha256"),
+                }
+            keys = list(cache)
+            caps = [data["Capability"] for data in cache.values()]
+            ann = None
+            view = None
+            if self._ann_wanted(len(caps)):
+                ann = self._load_ann(matrix, header["matrix_id"])
+                if ann is None:
+                    # no usable centroids on disk: train and write the cache back in list order,
+                    # so the next start loads them instead of training again
+                    view = self._save_cache_to_disk(cache)
+                    if view is None:
+                        # could not write (e.g. read-only dir), cluster in memory (copies the matrix)
+                        keys, caps, matrix, ann = self._train_ann(keys, caps, matrix)
+            self._set_cache(cache, view or _CacheView(FlatIndex(matrix, normalized=True), keys, caps, ann))
+            logging.info(f"Cache loaded from {self.cache_file}")
+        except Exception as e:
+            logging.error(f"Error loading cache from disk: {e}")
+
+    def _load_ann(self, matrix, matrix_id) -> Optional[IVFIndex]:
+        """IVF index saved for this exact matrix file, or None."""
+        if not self.ivf_file.exists():
+            return None
+        try:
+            params = IVFIndex.load_params(self.ivf_file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Error loading IVF index {self.ivf_file}: {e}")
+            return None
+        offsets = params.get("offsets")
+        if str(params.get("matrix_id")) != matrix_id or offsets is None or int(offsets[-1]) != matrix.shape[0]:
+            logging.warning(f"IVF index {self.ivf_file} does not match {self.cache_file}, retraining")
+            return None
+        return IVFIndex(matrix, params["centroids"], offsets, config.fsstore_ivf_nprobe)
+
     def clear_cache(self):
-        """Clear the in-memory cache and remove the cache file"""
-        self._skill_embedding_cache = {}
-        if self.cache_file.exists():
-            self.cache_file.unlink()  # Remove the cache file
-        
+        """Clear the in-memory cache and remove the cache files"""
+        self._set_cache({})
+        for cache_file in (self.cache_file, self.meta_file, self.legacy_cache_file, self.ivf_file):
+            if cache_file.exists():
+                cache_file.unlink()  # Remove the cache file
+
+    def _scan_skill(self, item, entry):
+        """
+        Compare one skill directory with its cached entry.
+
+        Returns:
+            (state, entry) with state "kept", "touched" (mtime only) or "changed";
+            (None, None) when the directory holds no readable skill
+        """
+        skill_md = find_skill_md(item)
+        if skill_md is None:
+            return None, None
+        try:
+            mtime_ns = skill_md.stat().st_mtime_ns
+            if entry is not None and entry.get("mtime_ns") == mtime_ns:
+                return "kept", entry
+            if entry is not None and entry.get("sha256") == hashlib.sha256(skill_md.read_bytes()).hexdigest():
+                return "touched", dict(entry, mtime_ns=mtime_ns)
+        except OSError as e:
+            logging.error(f"Error reading {skill_md}: {e}")
+            return None, None
+        entry = self._read_skill(item, skill_md)
+        return ("changed", entry) if entry is not None else (None, None)
+
+    def _record_stage(self, stats, stage, items, seconds):
+        stats[stage] = {"items": items, "seconds": seconds, "per_second": items / seconds if seconds > 0 else 0.0}
+        ingest_stage_time_histogram.record(seconds, {"stage": stage})
+
+    @tracer.start_as_current_span("refresh_cache")
     def refresh_cache(self):
-        """Refresh the cache by clearing it and repopulating from the skill folders"""
-        self.clear_cache()
-        self._load_cache_from_disk()  # Try to load existing cache first
-        
-        # Repopulate cache with skills from folder
-        dir_path = Path(self.path).resolve()
-        for item in dir_path.iterdir():
-            if item.is_dir():
-               self.load_skill(item)
-        # Save the refreshed cache to disk
-        self._save_cache_to_disk()
+        """
+        Incrementally sync the cache with the skill folders.
+
+        A skill is re-parsed and re-embedded only when its SKILL.md changed: an
+        unchanged mtime is trusted, and a touched file whose sha256 still matches is
+        kept. Deleted skills are dropped. The new cache is built on the side and
+        swapped in, so concurrent searches keep using the previous snapshot.
+        Use clear_cache() first to force a full rebuild.
+
+        Ingestion is staged: a thread pool parses SKILL.md files, changed skills
+        are handed to the batched embedder in chunks while parsing continues, and
+        the matrix and sidecar are written once at the end. Per-stage throughput
+        is logged and kept in last_refresh_stats.
+
+        Returns:
+            (added_or_changed, removed) counts
+        """
+        with self._refresh_lock:
+            if not self._skill_embedding_cache:
+                self._load_cache_from_disk()  # Try to load existing cache first
+            old_cache = self._skill_embedding_cache
+            stats = {}
+            dir_path = Path(self.path).resolve()
+            items = [item for item in dir_path.iterdir() if item.is_dir()]
+
+            scanned = {}
+            changed = []
+            chunk = []
+            embed_futures = []
+            embed_started = None
+            chunk_size = max(1, config.embedding_batch_size)
+            parse_started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, config.fsstore_ingest_workers)) as parse_pool, \
+                    ThreadPoolExecutor(max_workers=max(1, config.fsstore_embed_workers)) as embed_pool:
+                futures = {parse_pool.submit(self._scan_skill, item, old_cache.get(str(item))): str(item)
+                           for item in items}
+                for future in as_completed(futures):
+                    state, entry = future.result()
+                    if entry is None:
+                        continue
+                    key = futures[future]
+                    scanned[key] = (state, entry)
+                    if state == "changed":
+                        changed.append(key)
+                        chunk.append(entry["Capability"])
+                        if len(chunk) >= chunk_size:
+                            embed_started = embed_started or time.perf_counter()
+                            embed_futures.append(embed_pool.submit(Capability.prefetch_embeddings, chunk))
+                            chunk = []
+                self._record_stage(stats, "parse", len(items), time.perf_counter() - parse_started)
+                if chunk:
+                    embed_started = embed_started or time.perf_counter()
+                    embed_futures.append(embed_pool.submit(Capability.prefetch_embeddings, chunk))
+                # an embedding failure aborts the refresh and keeps the previous cache
+                for future in embed_futures:
+                    future.result()
+            if embed_started is not None:
+                self._record_stage(stats, "embed", len(changed), time.perf_counter() - embed_started)
+
+            # keep directory order so the matrix layout is stable across refreshes
+            new_cache = {str(item): scanned[str(item)][1] for item in items if str(item) in scanned}
+            touched = any(state == "touched" for state, _ in scanned.values())
+            removed = len(old_cache.keys() - new_cache.keys())
+            self.last_refresh_stats = stats
+            if not changed and not removed and not touched and self.cache_file.exists():
+                return 0, 0
+            # write the refreshed cache and build its snapshot before swapping,
+            # searches keep using the previous one meanwhile
+            write_started = time.perf_counter()
+            view = self._save_cache_to_disk(new_cache)
+            if view is None:
+                view = self._build_view(new_cache)
+            self._set_cache(new_cache, view)
+            self._record_stage(stats, "write", len(new_cache), time.perf_counter() - write_started)
+            logging.info(f"Refreshed {self.path}: {len(changed)} added or changed, {removed} removed; " +
+                         ", ".join(f"{stage} {s['items']} in {s['seconds']:.3f}s ({s['per_second']:.1f}/s)"
+                                   for stage, s in stats.items()))
+            return len(changed), removed
+
+    def start_watcher(self, interval=None):
+        """Poll the skill folders in the background and apply changes while serving."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        interval = config.fsstore_watch_interval if interval is None else interval
+        self._watcher_stop.clear()
+
+        def watch():
+            while not self._watcher_stop.wait(interval):
+                try:
+                    self.refresh_cache()
+                except Exception as e:
+                    logging.error(f"Error refreshing {self.path}: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="scl-fsstore-watch", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._watcher_stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
 
     @tracer.start_as_current_span("get_cap_by_name")
     def get_cap_by_name(self, name)-> Capability:
-        for path, data in self._skill_embedding_cache.items():
-            cur = data["Capability"]
-            if cur.name == name:
-                return Capability(name=cur.name, type=cur.type, description=cur.description)# , path=path
-                #[{"name":cur.name,"type":cur.type, "desc": cur.description, "path": path}]
-        return None
+        data = self._name_index.get(name)
+        if data is None:
+            return None
+        cur = data["Capability"]
+        return Capability(name=cur.name, type=cur.type, description=cur.description)# , path=path
+        #[{"name":cur.name,"type":cur.type, "desc": cur.description, "path": path}]
 
-    @tracer.start_as_current_span("search_by_similarity")
-    def search_by_similarity(self, msg: Msg, limit=5, min_similarity=0.5) -> Dict[str, Capability]:
+    @tracer.start_as_current_span("get_caps_by_names")
+    def get_caps_by_names(self, names) -> Dict[str, Capability]:
+        """Resolve many names in one pass; unknown names are left out."""
+        name_index = self._name_index
         result = {}
-        for path, data in self._skill_embedding_cache.items():
-            skill_embedding = data["Capability"].embedding_description
-            query_embedding = msg.embed
-            similarity = self.cosine_similarity(query_embedding, skill_embedding)
-            if similarity >= min_similarity:
+        for name in names:
+            data = name_index.get(name)
+            if data is not None:
                 cur = data["Capability"]
-                result[cur.name]=Capability(name=cur.name, type=cur.type, description=cur.description)# , path=path)
-                    #{"name":cur.name,"type":cur.type, "desc": cur.description, "path": path})
-            if len(result) >= limit:
-                break
+                result[name] = Capability(name=cur.name, type=cur.type, description=cur.description)
+        return result
+
+    def _get_index(self) -> _CacheView:
+        """Return the current search snapshot, building the normalized matrix on first use."""
+        index = self._index
+        if index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = self._build_view(self._skill_embedding_cache)
+                index = self._index
+        return index
+
+    def _build_view(self, cache) -> _CacheView:
+        """In-memory search snapshot of `cache`."""
+        keys = list(cache.keys())
+        caps = [cache[key]["Capability"] for key in keys]
+        Capability.prefetch_embeddings(caps)
+        if caps:
+            matrix = normalize_rows(np.stack([cap.embedding_description for cap in caps]))
+        else:
+            matrix = np.zeros((0, int(config.embedding_model_dims)), dtype=np.float32)
+        ann = None
+        if self._ann_wanted(len(caps)):
+            keys, caps, matrix, ann = self._train_ann(keys, caps, matrix)
+        return _CacheView(FlatIndex(matrix, normalized=True), keys, caps, ann)
+
+    def ann_recall(self, k=10, samples=100, nprobe=None) -> Optional[float]:
+        """
+        Recall@k of the IVF index against exact search, using stored rows as queries.
+
+        Returns:
+            Fraction in [0, 1], or None when the store searches exactly
+        """
+        return self._view_recall(self._get_index(), k, samples, nprobe)
+
+    @staticmethod
+    def _view_recall(view: _CacheView, k=10, samples=100, nprobe=None) -> Optional[float]:
+        if view.ann is None or len(view.index) == 0:
+            return None
+        rng = np.random.default_rng(0)
+        rows = rng.choice(len(view.index), min(samples, len(view.index)), replace=False)
+        return view.ann.recall(view.index, view.index.matrix[np.sort(rows)], k, nprobe)
+
+    def _to_caps(self, view: _CacheView, hits) -> Dict[str, Capability]:
+        result = {}
+        for row, _ in hits:
+            cur = view.caps[row]
+            result[cur.name]=Capability(name=cur.name, type=cur.type, description=cur.description)# , path=path)
         return result
 
+    def search_scored(self, query, limit=5, min_similarity=0.5) -> List[Tuple[Capability, float]]:
+        """
+        Like search_by_similarity, but takes a raw query vector and keeps the scores.
+
+        Used to merge results across stores (see ShardedFsStore).
+        """
+        view = self._get_index()
+        result = []
+        for row, score in view.searcher().search(query, limit, min_similarity):
+            cur = view.caps[row]
+            result.append((Capability(name=cur.name, type=cur.type, description=cur.description), score))
+        return result
+
+    @tracer.start_as_current_span("search_by_similarity")
+    def search_by_similarity(self, msg: Msg, limit=5, min_similarity=0.5) -> Dict[str, Capability]:
+        """Top-k by cosine similarity, best match first; approximate when an IVF index is built."""
+        view = self._get_index()
+        return self._to_caps(view, view.searcher().search(msg.embed, limit, min_similarity))
+
+    @tracer.start_as_current_span("search_by_similarity_batch")
+    def search_by_similarity_batch(self, msgs: List[Msg], limit=5, min_similarity=0.5) -> List[Dict[str, Capability]]:
+        """
+        Score many queries with one matrix product.
+
+        Args:
+            msgs: Msg objects or raw query vectors
+        Returns:
+            One result dict per query, in input order
+        """
+        view = self._get_index()
+        if not msgs:
+            return []
+        queries = np.stack([msg.embed if isinstance(msg, Msg) else np.asarray(msg, dtype=np.float32) for msg in msgs])
+        return [self._to_caps(view, hits) for hits in view.searcher().search_batch(queries, limit, min_similarity)]
+
+    def _get_history(self) -> HistoryBuffer:
+        if self._history is None:
+            with self._history_lock:
+                if self._history is None:
+                    history = HistoryBuffer(config.fsstore_history_capacity,
+                                            int(config.embedding_model_dims),
+                                            config.fsstore_history_eviction)
+                    if config.fsstore_history_snapshot and self.history_file.exists():
+                        history.load(self.history_file)
+                    self._history = history
+        return self._history
+
+    def snapshot_history(self):
+        """Write the invocation history next to the cache files."""
+        if self._history is None:
+            return
+        try:
+            self._history.save(self.history_file)
+            self._records_since_snapshot = 0
+        except OSError as e:
+            logging.error(f"Error saving history snapshot: {e}")
+
     @tracer.start_as_current_span("record_cap_history")
     def record(self, msg: Msg, cap:Capability):
-        ## having history in FS may too huge, skip for now.
-        ## otherwise have a in memory db with size limited maybe an option.
-        return
+        ## history lives in a fixed-size in-memory ring buffer, optionally snapshotted to disk
+        if cap is None:
+            return
+        try:
+            self._get_history().add(msg.embed, cap.name)
+        except Exception as e:
+            # e.g. a provider that ignores `dimensions`; recording must not fail the tool call
+            logging.error(f"Error recording history for {cap.name}: {e}")
+            return
+        if config.fsstore_history_snapshot:
+            self._records_since_snapshot += 1
+            if self._records_since_snapshot >= config.fsstore_history_snapshot_every:
+                self.snapshot_history()
 
     @tracer.start_as_current_span("getCapsByHistory")
     def getCapsByHistory(self, msg:Msg, limit=5, min_similarity=0.5) -> Dict[str, Capability]:
-        ## having history in FS may too huge, skip for now.
-        ## otherwise have a in memory db with size limited maybe an option.
-        return
-    
+        history = self._get_history()
+        if len(history) == 0:
+            return {}
+        names = [name for name, _ in history.search(msg.embed, limit, min_similarity)]
+        # capabilities removed from the catalog since they were recorded are skipped
+        return self.get_caps_by_names(names)
+
+    def search_history(self, query, limit=5, min_similarity=0.5) -> List[Tuple[str, float]]:
+        """Best (capability name, similarity) pairs from the invocation history."""
+        history = self._get_history()
+        if len(history) == 0:
+            return []
+        return history.search(query, limit, min_similarity)
+
     def cosine_similarity(self, vec1, vec2):
         """
         计算两个向量的余弦相似度
         """
-        vec1 = np.array(vec1)
-        vec2 = np.array(vec2)
+        vec1 = np.asarray(vec1, dtype=np.float32)
+        vec2 = np.asarray(vec2, dtype=np.float32)
         
         dot_product = np.dot(vec1, vec2)
         norm_vec1 = np.linalg.norm(vec1)
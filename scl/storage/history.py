@@ -0,0 +1,135 @@
+"""
+Fixed-capacity invocation history for stores without a database.
+"""
+import os
+import time
+import logging
+import threading
+import numpy as np
+from typing import List, Tuple
+from scl.storage.vecindex import normalize_rows
+
+HISTORY_EVICTIONS = ("age", "lfu")
+
+
+class HistoryBuffer:
+    """
+    Ring buffer of (query embedding, capability name) pairs.
+
+    Embeddings live in one preallocated, L2-normalized float32 matrix, so memory
+    is fixed at capacity * dims * 4 bytes. When the buffer is full, "age" eviction
+    overwrites the oldest slot and "lfu" overwrites the slot returned least often
+    by search (oldest first on ties). A search scores every slot with one
+    matrix-vector product and keeps the best slot per capability.
+    """
+
+    def __init__(self, capacity: int, dims: int, eviction: str = "age"):
+        if eviction not in HISTORY_EVICTIONS:
+            raise ValueError(f"Unknown history eviction '{eviction}', expected one of {HISTORY_EVICTIONS}")
+        self.capacity = max(1, int(capacity))
+        self.dims = int(dims)
+        self.eviction = eviction
+        self._vectors = np.zeros((self.capacity, self.dims), dtype=np.float32)
+        self._name_ids = np.zeros(self.capacity, dtype=np.int32)
+        self._timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self._hits = np.zeros(self.capacity, dtype=np.int64)
+        self._names = []
+        self._name_to_id = {}
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _name_id(self, name: str) -> int:
+        name_id = self._name_to_id.get(name)
+        if name_id is None:
+            name_id = len(self._names)
+            self._names.append(name)
+            self._name_to_id[name] = name_id
+        return name_id
+
+    def _victim(self) -> int:
+        if self._size < self.capacity:
+            slot = self._size
+            self._size += 1
+            return slot
+        if self.eviction == "lfu":
+            # lexsort sorts by the last key first: fewest hits, then oldest
+            return int(np.lexsort((self._timestamps, self._hits))[0])
+        slot = self._next
+        self._next = (self._next + 1) % self.capacity
+        return slot
+
+    def add(self, embedding, name: str):
+        vector = normalize_rows(embedding)[0]
+        if vector.shape[0] != self.dims:
+            raise ValueError(f"history expects {self.dims}-dim embeddings, got {vector.shape[0]}")
+        with self._lock:
+            slot = self._victim()
+            self._vectors[slot] = vector
+            self._name_ids[slot] = self._name_id(name)
+            self._timestamps[slot] = time.time()
+            self._hits[slot] = 0
+
+    def search(self, query, limit=5, min_similarity=0.5) -> List[Tuple[str, float]]:
+        """Best (capability name, similarity) pairs, one per capability, highest first."""
+        if limit <= 0:
+            return []
+        query = normalize_rows(query)[0]
+        with self._lock:
+            size = self._size
+            if size == 0:
+                return []
+            scores = self._vectors[:size] @ query
+            candidates = np.flatnonzero(scores >= min_similarity)
+            if candidates.size == 0:
+                return []
+            order = candidates[np.argsort(-scores[candidates], kind="stable")]
+            # first occurrence per name in score order is that name's best slot
+            _, first = np.unique(self._name_ids[order], return_index=True)
+            picks = order[np.sort(first)][:limit]
+            self._hits[picks] += 1
+            return [(self._names[self._name_ids[slot]], float(scores[slot])) for slot in picks]
+
+    def save(self, path):
+        """Snapshot to an .npz file (no pickle), written via rename."""
+        with self._lock:
+            size = self._size
+            arrays = {
+                "vectors": self._vectors[:size].copy(),
+                "name_ids": self._name_ids[:size].copy(),
+                "timestamps": self._timestamps[:size].copy(),
+                "hits": self._hits[:size].copy(),
+                "names": np.array(self._names, dtype=str),
+            }
+        tmp_path = f"{path}.tmp.{os.getpid()}.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def load(self, path) -> bool:
+        """Restore a snapshot; entries beyond the current capacity are dropped, oldest first."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                vectors = data["vectors"]
+                if vectors.ndim != 2 or (vectors.shape[0] and vectors.shape[1] != self.dims):
+                    logging.warning(f"History snapshot {path} has different dims, ignoring it")
+                    return False
+                names = [str(name) for name in data["names"]]
+                name_ids, timestamps, hits = data["name_ids"], data["timestamps"], data["hits"]
+        except (OSError, KeyError, ValueError) as e:
+            logging.warning(f"Error loading history snapshot {path}: {e}")
+            return False
+        keep = np.argsort(timestamps, kind="stable")[-self.capacity:]
+        with self._lock:
+            self._names, self._name_to_id = names, {name: i for i, name in enumerate(names)}
+            size = keep.size
+            self._vectors[:size] = vectors[keep]
+            self._name_ids[:size] = name_ids[keep]
+            self._timestamps[:size] = timestamps[keep]
+            self._hits[:size] = hits[keep]
+            self._size = size
+            # slots are in age order, so slot 0 is overwritten first once full
+            self._next = 0
+        return True
@@ -2,6 +2,7 @@ import sys
 import os
 import json
 import logging
+import numpy as np
 from typing import Optional, List, Dict
 
 # Add the StructuredContextLanguage directory to the path
@@ -23,7 +24,7 @@ try:
         l2_distance,
     )
     from pyobvector.schema import ReplaceStmt
-    from sqlalchemy import JSON, Column, String, Table, BigInteger, text
+    from sqlalchemy import JSON, Column, String, Table, BigInteger, bindparam, text
     from sqlalchemy.dialects.mysql import LONGTEXT
     logging.info("pyobvector imported successfully")
 except ImportError as e:
@@ -69,6 +70,8 @@ class OceanBaseStore(StoreBase):
         
         if init:
             self.create_table()
+        # existing databases need it too, insert_capability bumps it in its transaction
+        self._create_catalog_version_table()
     
     def _create_client(self):
         """Create and initialize OceanBase vector client"""
@@ -169,6 +172,39 @@ class OceanBaseStore(StoreBase):
             logging.error(f"Failed to create table: {e}")
             raise
     
+    @property
+    def catalog_version_table(self) -> str:
+        return f"{self.table_name}_catalog_version"
+
+    def _create_catalog_version_table(self):
+        """Single-row counter bumped with every write to the capability table"""
+        try:
+            with self.obvector.engine.connect() as conn:
+                conn.execute(text(f"""
+                    CREATE TABLE IF NOT EXISTS {self.catalog_version_table} (
+                        id INT PRIMARY KEY,
+                        version BIGINT NOT NULL
+                    )
+                """))
+                conn.execute(text(f"INSERT IGNORE INTO {self.catalog_version_table} (id, version) VALUES (1, 0)"))
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Failed to create catalog version table: {e}")
+
+    def _bump_store_catalog_version(self, conn):
+        conn.execute(text(f"UPDATE {self.catalog_version_table} SET version = version + 1 WHERE id = 1"))
+
+    def catalog_version(self) -> int:
+        """Catalog version stored in the database, so writes from other processes are seen too"""
+        try:
+            with self.obvector.engine.connect() as conn:
+                row = conn.execute(text(f"SELECT version FROM {self.catalog_version_table} WHERE id = 1")).fetchone()
+                if row is not None:
+                    return int(row[0])
+        except Exception as e:
+            logging.warning(f"Failed to read catalog version: {e}")
+        return self._catalog_version
+
     @tracer.start_as_current_span("insert_capability")
     def insert_capability(self, cap: Capability):
         """
@@ -195,9 +231,9 @@ class OceanBaseStore(StoreBase):
             # Ensure embedding_description is in list format
             embedding = cap.embedding_description
             if not isinstance(embedding, list):
-                # If it's a numpy array or other format, convert to list
+                # float32 numpy array or other format, convert to a list of Python floats
                 try:
-                    embedding = list(embedding)
+                    embedding = np.asarray(embedding, dtype=np.float32).tolist()
                 except (TypeError, ValueError):
                     logging.error(f"Cannot convert embedding_description to list format: {type(embedding)}")
                     return None
@@ -239,7 +275,10 @@ class OceanBaseStore(StoreBase):
                         id_result = conn.execute(select_id_stmt, {"name": cap.name})
                         cap_id = id_result.fetchone()[0]
                         logging.info(f"Capability '{cap.name}' inserted successfully, ID: {cap_id}")
+                    # bumped in the same transaction as the write
+                    self._bump_store_catalog_version(conn)
             
+            self.bump_catalog_version()
             return cap_id
             
         except Exception as e:
@@ -265,18 +304,8 @@ class OceanBaseStore(StoreBase):
                 row = result.fetchone()
                 
                 if row:
-                    name_val, type_val, llm_desc, function_impl = row
-                    # Parse llm_description JSON
-                    try:
-                        if isinstance(llm_desc, str):
-                            llm_desc = json.loads(llm_desc)
-                        elif llm_desc is None:
-                            llm_desc = {}
-                    except (json.JSONDecodeError, TypeError):
-                        llm_desc = llm_desc if llm_desc else {}
-                    
-                    logging.info(f"Found capability: {name_val}")
-                    return Capability(name=name_val, type=type_val, llm_description=llm_desc, function_impl=function_impl)
+                    logging.info(f"Found capability: {row[0]}")
+                    return self._row_to_cap(row)
                 else:
                     logging.info(f"Capability with name '{name}' not found")
                     return None
@@ -284,6 +313,48 @@ class OceanBaseStore(StoreBase):
         except Exception as e:
             logging.error(f"Query failed: {e}")
             return None
+
+    @staticmethod
+    def _row_to_cap(row) -> Capability:
+        """Build a Capability from a (name, type, llm_description, function_impl) row"""
+        name_val, type_val, llm_desc, function_impl = row
+        # Parse llm_description JSON
+        try:
+            if isinstance(llm_desc, str):
+                llm_desc = json.loads(llm_desc)
+            elif llm_desc is None:
+                llm_desc = {}
+        except (json.JSONDecodeError, TypeError):
+            llm_desc = llm_desc if llm_desc else {}
+        return Capability(name=name_val, type=type_val, llm_description=llm_desc, function_impl=function_impl)
+
+    @tracer.start_as_current_span("get_caps_by_names")
+    def get_caps_by_names(self, names) -> Dict[str, Capability]:
+        """Query many capabilities in one round trip; unknown names are left out"""
+        try:
+            return self.lookup_caps_by_names(names)
+        except Exception as e:
+            logging.error(f"Query failed: {e}")
+            return {}
+
+    def lookup_caps_by_names(self, names) -> Dict[str, Capability]:
+        """Like get_caps_by_names, but a failed query raises instead of reading as not found"""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        with self.obvector.engine.connect() as conn:
+            select_sql = text(f"""
+                SELECT 
+                    name,
+                    type,
+                    llm_description,
+                    function_impl
+                FROM {self.table_name}
+                WHERE name IN :names
+            """).bindparams(bindparam("names", expanding=True))
+            
+            found = {row[0]: self._row_to_cap(row) for row in conn.execute(select_sql, {"names": names})}
+            return {name: found[name] for name in names if name in found}
     
     @tracer.start_as_current_span("search_by_similarity")
     def search_by_similarity(self, msg: Msg, limit=5, min_similarity=0.5) -> Dict[str,Capability]:
@@ -295,7 +366,7 @@ class OceanBaseStore(StoreBase):
             # Ensure query_embedding is in list format
             if not isinstance(query_embedding, list):
                 try:
-                    query_embedding = list(query_embedding)
+                    query_embedding = np.asarray(query_embedding, dtype=np.float32).tolist()
                 except (TypeError, ValueError):
                     logging.error(f"Cannot convert query_embedding to list format: {type(query_embedding)}")
                     return []
@@ -363,7 +434,8 @@ class OceanBaseStore(StoreBase):
             
         except Exception as e:
             logging.error(f"Similarity search failed: {e}", exc_info=True)
-            return {}
+            # None rather than {}, so a failed search is not cached as "no results"
+            return None
     
     @tracer.start_as_current_span("record_cap_history_safe")
     def record(self, msg: Msg, cap: Capability):
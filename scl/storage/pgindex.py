@@ -0,0 +1,235 @@
+"""
+pgvector index management for PgVectorStore.
+"""
+import json
+import math
+import re
+import logging
+from contextlib import contextmanager
+
+# metric -> (distance operator, index opclass, similarity as a function of the distance)
+# the l2 / ip similarities equal cosine similarity for unit-length embeddings
+METRICS = {
+    "cosine": ("<=>", "vector_cosine_ops", "1 - ({distance})"),
+    "l2": ("<->", "vector_l2_ops", "1 - power({distance}, 2) / 2"),
+    "ip": ("<#>", "vector_ip_ops", "-({distance})"),
+}
+METHODS = ("hnsw", "ivfflat")
+
+# pgvector guidance for ivfflat: rows / 1000 lists up to 1M rows, sqrt(rows) above
+IVFFLAT_ROWS_PER_LIST = 1000
+IVFFLAT_SQRT_ABOVE = 1_000_000
+# a bulk load of at least this many rows per existing row drops the index and builds it afterwards
+BULK_LOAD_DROP_RATIO = 1.0
+
+
+def ivfflat_lists_for(rows: int) -> int:
+    """Number of ivfflat lists for a table of `rows` rows; 0 means too small to be worth an index."""
+    if rows > IVFFLAT_SQRT_ABOVE:
+        return int(math.sqrt(rows))
+    return rows // IVFFLAT_ROWS_PER_LIST
+
+
+def _plan_index_names(plan: dict):
+    if "Index Name" in plan:
+        yield plan["Index Name"]
+    for child in plan.get("Plans", []):
+        yield from _plan_index_names(child)
+
+
+class PgVectorIndex:
+    """
+    The ANN index on one vector column, kept consistent with the distance metric.
+
+    The opclass is derived from `metric`, and the queries use the matching
+    operator through distance() / similarity(). A mismatched pair (e.g. an
+    l2 index under a cosine ORDER BY) is never picked by the planner.
+    ensure() creates the index, or recreates it when the existing one has a
+    different method or opclass. Builds use CREATE INDEX CONCURRENTLY under a
+    temporary name and swap it in when it is valid, so searches keep running
+    (on the old index) for the whole build.
+
+    HNSW can be built on an empty table and stays good as rows are added.
+    IVFFlat learns its lists from the rows present at build time. It is sized
+    to the row count, skipped for tables under IVFFLAT_ROWS_PER_LIST rows
+    (a sequential scan is exact and fast there), and should be rebuilt after
+    bulk loads.
+
+    configure() sets hnsw.ef_search or ivfflat.probes for the current
+    transaction only, so concurrent queries on pooled connections do not
+    interfere.
+    """
+
+    def __init__(self, table: str, column: str, name: str, metric: str = "cosine", method: str = "hnsw",
+                 hnsw_m: int = 16, hnsw_ef_construction: int = 64, ef_search: int = 40,
+                 lists: int = 0, probes: int = 0, build_mem: str = ""):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown vector metric {metric!r}, expected one of {sorted(METRICS)}")
+        if method not in METHODS:
+            raise ValueError(f"Unknown vector index {method!r}, expected one of {list(METHODS)}")
+        self.table = table
+        self.column = column
+        self.name = name
+        self.metric = metric
+        self.method = method
+        self.hnsw_m = int(hnsw_m)
+        self.hnsw_ef_construction = int(hnsw_ef_construction)
+        self.ef_search = int(ef_search)
+        # configured lists / probes, 0 = derived from the row count / lists
+        self.lists = int(lists)
+        self.probes = int(probes)
+        self.build_mem = build_mem
+        # lists of the ivfflat index as built, None when there is no index
+        self.built_lists = None
+
+    @property
+    def operator(self) -> str:
+        return METRICS[self.metric][0]
+
+    @property
+    def opclass(self) -> str:
+        return METRICS[self.metric][1]
+
+    def distance(self, column: str = None) -> str:
+        """ORDER BY expression against a %s::vector parameter; this is what the index serves."""
+        return f"{column or self.column} {self.operator} %s::vector"
+
+    def similarity(self, column: str = None) -> str:
+        """Similarity (higher is closer) against a %s::vector parameter."""
+        return METRICS[self.metric][2].format(distance=self.distance(column))
+
+    @property
+    def building_name(self) -> str:
+        """Name of the index while it is built, renamed to `name` once it is valid."""
+        return f"{self.name}_new"
+
+    def _definition(self, lists: int, name: str = None) -> str:
+        if self.method == "hnsw":
+            options = f"m = {self.hnsw_m}, ef_construction = {self.hnsw_ef_construction}"
+        else:
+            options = f"lists = {lists}"
+        return (f"CREATE INDEX CONCURRENTLY {name or self.name} ON {self.table} "
+                f"USING {self.method} ({self.column} {self.opclass}) WITH ({options});")
+
+    def _current(self, cursor):
+        cursor.execute("SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname = %s;",
+                       (self.table, self.name))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _matches(self, indexdef: str) -> bool:
+        return f"USING {self.method} " in indexdef and self.opclass in indexdef
+
+    @contextmanager
+    def _maintenance(self, conn):
+        """
+        Autocommit cursor (CONCURRENTLY cannot run in a transaction block),
+        serialized across processes by an advisory lock on the index name.
+        """
+        conn.autocommit = True
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT pg_advisory_lock(hashtext(%s));", (self.name,))
+            try:
+                yield cursor
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(hashtext(%s));", (self.name,))
+        finally:
+            cursor.close()
+            conn.autocommit = False
+
+    def ensure(self, conn) -> bool:
+        """
+        Create the index if it is missing or built for another method/metric,
+        without blocking concurrent searches.
+
+        Returns:
+            True if the index was (re)built
+        """
+        with self._maintenance(conn) as cursor:
+            indexdef = self._current(cursor)
+            if indexdef is not None and self._matches(indexdef):
+                match = re.search(r"lists\s*=\s*'?(\d+)", indexdef)
+                self.built_lists = int(match.group(1)) if match else None
+                return False
+            if indexdef is not None:
+                logging.info(f"索引 {self.name} 与当前配置({self.method}, {self.opclass})不一致, 重建: {indexdef}")
+            self._build(cursor)
+            return True
+
+    def build(self, conn):
+        """Rebuild the index, sizing ivfflat lists to the current row count, without blocking searches."""
+        with self._maintenance(conn) as cursor:
+            self._build(cursor)
+
+    def drop(self, conn):
+        """Drop the index without blocking searches, e.g. before a bulk load; build() recreates it."""
+        with self._maintenance(conn) as cursor:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name};")
+            self.built_lists = None
+
+    def bulk_load_plan(self, rows: int, batch: int) -> str:
+        """
+        How to treat the index around loading `batch` rows into a table of `rows` rows.
+
+        Returns:
+            "drop": drop it before the load and build it afterwards, cheaper than
+                maintaining it row by row for a load the size of the table
+            "rebuild": keep it during the load and rebuild it afterwards, because
+                the ivfflat lists no longer fit the row count
+            "keep": maintain it during the load, nothing to do afterwards
+        """
+        if batch >= rows * BULK_LOAD_DROP_RATIO:
+            return "drop"
+        if self.method == "ivfflat" and not self.lists and ivfflat_lists_for(rows + batch) != (self.built_lists or 0):
+            return "rebuild"
+        return "keep"
+
+    def _build(self, cursor):
+        cursor.execute(f"SELECT count(*) FROM {self.table} WHERE {self.column} IS NOT NULL;")
+        rows = cursor.fetchone()[0]
+        lists = 0
+        if self.method == "ivfflat":
+            lists = self.lists or ivfflat_lists_for(rows)
+            if lists <= 0:
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name};")
+                self.built_lists = None
+                logging.info(f"{self.table} 仅有 {rows} 行, 暂不建立ivfflat索引, 批量导入后请重建")
+                return
+        if self.build_mem:
+            cursor.execute("SELECT set_config('maintenance_work_mem', %s, false);", (self.build_mem,))
+        # the new index is built next to the old one, which keeps serving searches;
+        # a leftover from an interrupted build is invalid and is dropped first
+        building = self.building_name
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {building};")
+        try:
+            cursor.execute(self._definition(lists, building))
+        except Exception:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {building};")
+            raise
+        finally:
+            if self.build_mem:
+                cursor.execute("RESET maintenance_work_mem;")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name};")
+        cursor.execute(f"ALTER INDEX {building} RENAME TO {self.name};")
+        cursor.execute(f"ANALYZE {self.table};")
+        self.built_lists = lists or None
+        logging.info(f"索引 {self.name} 已建立: {self._definition(lists)} ({rows} 行)")
+
+    def configure(self, cursor, limit: int = 0):
+        """Per-query search settings, scoped to the current transaction (SET LOCAL)."""
+        if self.method == "hnsw":
+            # hnsw returns at most ef_search rows, so it must cover the LIMIT
+            ef_search = max(self.ef_search, int(limit))
+            cursor.execute("SELECT set_config('hnsw.ef_search', %s, true);", (str(ef_search),))
+        elif self.built_lists:
+            probes = self.probes or max(1, round(math.sqrt(self.built_lists)))
+            cursor.execute("SELECT set_config('ivfflat.probes', %s, true);", (str(min(probes, self.built_lists)),))
+
+    def uses_index(self, cursor, sql: str, params) -> bool:
+        """Whether EXPLAIN of `sql` reads this index."""
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return self.name in set(_plan_index_names(plan[0]["Plan"]))
@@ -0,0 +1,161 @@
+"""
+Thread-safe psycopg2 connection pool used by PgVectorStore.
+"""
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+
+
+class PgConnectionPool:
+    """
+    Bounded pool of psycopg2 connections; each operation borrows one for its duration.
+
+    `minconn` connections are opened up front and at most `maxconn` exist at a
+    time. When all of them are in use, a borrower waits up to `timeout` seconds
+    and then gets PoolError. A connection idle for longer than
+    `health_check_interval` seconds is checked with `SELECT 1` before it is
+    handed out. Closed or failing connections are dropped and replaced. New
+    connections are opened with exponential backoff (`retries` attempts), and
+    `on_connect(conn)` runs once per new connection, e.g. to register the
+    pgvector type.
+
+    A connection goes back to the pool with its transaction rolled back, so
+    callers commit explicitly, as they did with a single shared connection.
+    """
+
+    def __init__(self, db_params: dict, minconn: int = 1, maxconn: int = 10, timeout: float = 30.0,
+                 health_check_interval: float = 30.0, retries: int = 5, backoff: float = 0.5,
+                 on_connect=None):
+        self.db_params = dict(db_params)
+        self.minconn = max(0, int(minconn))
+        self.maxconn = max(1, int(maxconn), self.minconn)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.retries = max(1, int(retries))
+        self.backoff = backoff
+        self.on_connect = on_connect
+        # (connection, last returned at); the most recently used is reused first
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        for _ in range(self.minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        delay = self.backoff
+        for attempt in range(1, self.retries + 1):
+            try:
+                conn = psycopg2.connect(**self.db_params)
+            except psycopg2.OperationalError as e:
+                if attempt == self.retries:
+                    raise
+                logging.info(f"连接失败(第{attempt}次), {delay:.1f}秒后重试: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            if self.on_connect is not None:
+                self.on_connect(conn)
+            return conn
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _healthy(self, conn, last_used) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logging.info(f"连接健康检查失败, 重新连接: {e}")
+            return False
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("connection pool is closed")
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        # reserve a slot, the connection is opened outside the lock
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolError(f"no free connection within {self.timeout}s (max {self.maxconn})")
+                    self._cond.wait(remaining)
+            if conn is not None:
+                if self._healthy(conn, last_used):
+                    return conn
+                # drop it and open a replacement in the same slot
+                self._close_quietly(conn)
+            try:
+                return self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+    def _release(self, conn, broken: bool):
+        if not broken and not conn.closed:
+            try:
+                if conn.status != psycopg2.extensions.STATUS_READY:
+                    conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        with self._cond:
+            if broken or conn.closed or self._closed:
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of the with-block."""
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self._release(conn, broken)
+
+    def discard_idle(self):
+        """Close idle connections so the next borrowers open fresh ones (and rerun on_connect)."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def close(self):
+        """Close idle connections now and borrowed ones when they are returned."""
+        self._closed = True
+        self.discard_idle()
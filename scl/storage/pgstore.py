@@ -1,17 +1,22 @@
 import psycopg2
 import sys
 import os
+import io
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 # Add the StructuredContextLanguage directory to the path
 scl_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(scl_root)
 from scl.meta.msg import Msg
-from typing import Dict
+from typing import Dict, Iterable
 from scl.otel.otel import tracer
 from scl.config import config
 from scl.storage.base import StoreBase
 from scl.meta.capability import Capability
+from scl.embeddings.impl import as_embedding
+from scl.storage.pgpool import PgConnectionPool
+from scl.storage.pgindex import PgVectorIndex
 Vector = None
 register_vector_info = None
 try:
@@ -24,6 +29,19 @@ except ImportError as e:
     register_vector_info = None
 
 
+def to_vector_literal(embedding) -> str:
+    """float32向量转为pgvector文本格式, 配合%s::vector使用, 不依赖vector类型注册"""
+    return "[" + ",".join(map(str, as_embedding(embedding).tolist())) + "]"
+
+
+def _copy_field(value) -> str:
+    """COPY文本格式的一个字段"""
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
 class PgVectorStore(StoreBase):
     def __init__(self, dbname="postgres", user="postgres", password="your_password", 
                  host="localhost", port="5432", init=False):
@@ -38,40 +56,81 @@ class PgVectorStore(StoreBase):
             "port": port
         }
                 
-        self.conn = None
-        self.connect()
+        self.pool = None
+        self.capability_index = self._vector_index("capabilities", "embedding_description", "idx_embedding_description")
+        self.history_index = self._vector_index("capabilities_invoked_history", "embedding",
+                                                "idx_capabilities_invoked_history_embedding")
         if init:
+            # 数据库可能尚不存在, 先连默认库创建, 再建立连接池
             self.create_database()
+        self.connect()
+        if init:
             self.enable_vector_extension()
+            # 扩展启用前建立的连接没有注册vector类型, 丢弃后按需重连
+            self.pool.discard_idle()
             self.create_table()
             self.create_history_table()
+        # 已有的库也需要版本表, 否则insert_capability中的版本更新会让事务失败
+        self.create_catalog_version_table()
+        # 向量索引与距离度量保持一致; 已有库中opclass不匹配的旧索引会被重建
+        self.ensure_indexes()
+
+    @staticmethod
+    def _vector_index(table, column, name) -> PgVectorIndex:
+        return PgVectorIndex(
+            table, column, name,
+            metric=config.pg_vector_metric,
+            method=config.pg_vector_index,
+            hnsw_m=config.pg_hnsw_m,
+            hnsw_ef_construction=config.pg_hnsw_ef_construction,
+            ef_search=config.pg_hnsw_ef_search,
+            lists=config.pg_ivfflat_lists,
+            probes=config.pg_ivfflat_probes,
+            build_mem=config.pg_index_build_mem,
+        )
             
+    @staticmethod
+    def _register_vector(conn):
+        """每个新连接注册一次vector类型"""
+        if Vector is None:
+            return
+        try:
+            # Try to register vector type
+            cursor = conn.cursor()
+            cursor.execute("SELECT typname, oid, typarray FROM pg_type WHERE typname = 'vector'")
+            result = cursor.fetchone()
+            cursor.close()
+            if result:
+                register_vector_info(result[1], result[2], conn)
+        except Exception as e:
+            logging.info(f"警告: 无法注册vector类型: {e}")
+        conn.rollback()
+
     def connect(self):
-        """连接到数据库"""
+        """建立连接池; 连接失败时按退避重试, 最终抛出psycopg2.OperationalError而不是退出进程"""
+        if self.pool is not None:
+            self.pool.close()
         try:
-            self.conn = psycopg2.connect(**self.db_params)
-            if Vector is not None:
-                try:
-                    # Try to register vector type
-                    cursor = self.conn.cursor()
-                    cursor.execute("SELECT typname, oid, typarray FROM pg_type WHERE typname = 'vector'")
-                    result = cursor.fetchone()
-                    cursor.close()
-                    if result:
-                        register_vector_info(result[1], result[2], self.conn)
-                except Exception as e:
-                    logging.info(f"警告: 无法注册vector类型: {e}")
+            self.pool = PgConnectionPool(
+                self.db_params,
+                minconn=config.pg_pool_min,
+                maxconn=config.pg_pool_max,
+                timeout=config.pg_pool_timeout,
+                health_check_interval=config.pg_pool_health_check_interval,
+                retries=config.pg_connect_retries,
+                on_connect=self._register_vector,
+            )
             logging.info("数据库连接成功！")
         except psycopg2.OperationalError as e:
             logging.info(f"连接失败: {e}")
             logging.info("请确保PostgreSQL已安装并运行")
-            sys.exit(1)
+            raise
 
     
     def close(self):
         """关闭数据库连接"""
-        if self.conn:
-            self.conn.close()
+        if self.pool:
+            self.pool.close()
             logging.info("数据库连接已关闭")
     
     def create_database(self):
@@ -99,92 +158,96 @@ class PgVectorStore(StoreBase):
             cursor.close()
             conn.close()
             
-            # 重新连接到新创建的数据库
-            self.connect()
-            
         except Exception as e:
             logging.info(f"创建数据库失败: {e}")
     
     def enable_vector_extension(self):
         """启用pgvector扩展"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-            self.conn.commit()
-            cursor.close()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+                conn.commit()
+                cursor.close()
             logging.info("pgvector扩展已启用")
         except Exception as e:
             logging.info(f"启用扩展失败: {e}")
-            self.conn.rollback()
     
     def create_history_table(self):
         """创建历史记录表"""
         try:
-            cursor = self.conn.cursor()
-            embedding_dims = os.getenv("EMBEDDING_MODEL_DIMS", 1024)
-            ## tbd UNIQUE(capability_id, embedding)?
-            create_table_sql = f"""
-            CREATE TABLE IF NOT EXISTS capabilities_invoked_history (
-                id SERIAL PRIMARY KEY,
-                capability_id INT REFERENCES capabilities(id),
-                embedding vector({embedding_dims})
-            );
-            
-            CREATE INDEX IF NOT EXISTS idx_capabilities_invoked_history_embedding 
-            ON capabilities_invoked_history USING ivfflat (embedding vector_l2_ops);
-            """
-            cursor.execute(create_table_sql)
-            self.conn.commit()
-            cursor.close()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                embedding_dims = os.getenv("EMBEDDING_MODEL_DIMS", 1024)
+                ## tbd UNIQUE(capability_id, embedding)?
+                create_table_sql = f"""
+                CREATE TABLE IF NOT EXISTS capabilities_invoked_history (
+                    id SERIAL PRIMARY KEY,
+                    capability_id INT REFERENCES capabilities(id),
+                    embedding vector({embedding_dims})
+                );
+                """
+                cursor.execute(create_table_sql)
+                conn.commit()
+                cursor.close()
             logging.info("表格创建成功")
         except Exception as e:
             logging.info(f"创建表格失败: {e}")
-            self.conn.rollback()
+
+    def create_catalog_version_table(self):
+        """创建目录版本表, 每次写入capabilities时加一, 供各进程的缓存判断是否失效"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS capabilities_catalog_version (
+                        id INT PRIMARY KEY,
+                        version BIGINT NOT NULL
+                    );
+                """)
+                cursor.execute("INSERT INTO capabilities_catalog_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;")
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            logging.info(f"创建目录版本表失败: {e}")
 
     def create_table(self):
         """创建函数存储表"""
         try:
-            cursor = self.conn.cursor()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
             
-            # 获取嵌入模型的维度
-            embedding_dims = config.embedding_model_dims
-            create_table_sql = f"""
-            CREATE TABLE IF NOT EXISTS capabilities (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(255) NOT NULL UNIQUE,
-                description TEXT NOT NULL UNIQUE,
-                type VARCHAR(255) NOT NULL,
-                embedding_description vector({embedding_dims}),
-                original_body TEXT NOT NULL,
-                llm_description JSONB NOT NULL,
-                function_impl TEXT NOT NULL
-            );
-            """
-            
-            cursor.execute(create_table_sql)
+                # 获取嵌入模型的维度
+                embedding_dims = config.embedding_model_dims
+                create_table_sql = f"""
+                CREATE TABLE IF NOT EXISTS capabilities (
+                    id SERIAL PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL UNIQUE,
+                    description TEXT NOT NULL UNIQUE,
+                    type VARCHAR(255) NOT NULL,
+                    embedding_description vector({embedding_dims}),
+                    original_body TEXT NOT NULL,
+                    llm_description JSONB NOT NULL,
+                    function_impl TEXT NOT NULL
+                );
+                """
             
-            # 创建索引以提高查询性能
-            # 为function_name创建索引
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_name ON capabilities(name);")
+                cursor.execute(create_table_sql)
             
-            # 为llm_description创建GIN索引以加速JSON查询
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_description ON capabilities USING GIN (llm_description);")
+                # 创建索引以提高查询性能
+                # 为function_name创建索引
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_name ON capabilities(name);")
             
-            # 为vector字段创建IVFFLAT索引以加速相似性搜索
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_embedding_description
-                ON capabilities 
-                USING ivfflat (embedding_description vector_l2_ops)
-                WITH (lists = 100);
-            """)
+                # 为llm_description创建GIN索引以加速JSON查询
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_description ON capabilities USING GIN (llm_description);")
+                # vector字段的索引由ensure_indexes按距离度量建立
             
-            self.conn.commit()
-            cursor.close()
+                conn.commit()
+                cursor.close()
             logging.info("表格创建成功，并已建立索引")
             
         except Exception as e:
             logging.info(f"创建表格失败: {e}")
-            self.conn.rollback()
     
     @tracer.start_as_current_span("insert_capability")
     def insert_capability(self, cap:Capability):
@@ -197,61 +260,295 @@ class PgVectorStore(StoreBase):
         try:                                    
             # 生成description的嵌入向量
             #embedding = Vector(cap.embedding_description)
-            cursor = self.conn.cursor()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
             
-            insert_sql = """
-            INSERT INTO capabilities (name, description, type, embedding_description, original_body, llm_description, function_impl)
-            VALUES (%s, %s, %s, %s, %s, %s::jsonb, %s)
-            RETURNING id;
-            """
-            logging.info(f"Inserting function: {cap.name}, {cap.description}, {cap.type}, {cap.original_body}, {cap.function_impl}")
-            cursor.execute(insert_sql, (cap.name, cap.description, cap.type, cap.embedding_description, cap.original_body, cap.llm_description, cap.function_impl))
-            cap_id = cursor.fetchone()[0]
+                insert_sql = """
+                INSERT INTO capabilities (name, description, type, embedding_description, original_body, llm_description, function_impl)
+                VALUES (%s, %s, %s, %s::vector, %s, %s::jsonb, %s)
+                RETURNING id;
+                """
+                logging.info(f"Inserting function: {cap.name}, {cap.description}, {cap.type}, {cap.original_body}, {cap.function_impl}")
+                cursor.execute(insert_sql, (cap.name, cap.description, cap.type, to_vector_literal(cap.embedding_description), cap.original_body, cap.llm_description, cap.function_impl))
+                cap_id = cursor.fetchone()[0]
+                # 与插入在同一事务中更新目录版本号
+                self._bump_store_catalog_version(cursor)
             
-            self.conn.commit()
-            cursor.close()
+                conn.commit()
+                cursor.close()
+            self.bump_catalog_version()
             
             logging.info(f"函数 '{cap.name}' 插入成功，ID: {cap_id}")
             return cap_id
             
         except psycopg2.errors.UniqueViolation as e:
             logging.info(f"函数名 '{cap.name}' 已存在（唯一约束违规）{e}")
-            self.conn.rollback()
             return None
         except Exception as e:
             logging.info(f"插入函数失败: {e}")
-            self.conn.rollback()
             return None
 
+    def ensure_indexes(self):
+        """建立缺失的向量索引, 或重建方法/opclass与配置不一致的索引"""
+        for index in (self.capability_index, self.history_index):
+            try:
+                with self.pool.connection() as conn:
+                    index.ensure(conn)
+            except Exception as e:
+                logging.info(f"建立索引 {index.name} 失败: {e}")
+
+    def rebuild_indexes(self):
+        """批量导入后重建向量索引, ivfflat的lists按当前行数重新计算"""
+        for index in (self.capability_index, self.history_index):
+            self._build_index(index)
+
+    def _build_index(self, index: PgVectorIndex):
+        try:
+            with self.pool.connection() as conn:
+                index.build(conn)
+        except Exception as e:
+            logging.info(f"重建索引 {index.name} 失败: {e}")
+
+    def _similarity_sql(self) -> str:
+        index = self.capability_index
+        return f"""
+                SELECT 
+                    name,
+                    type,
+                    llm_description,
+                    {index.similarity()} as similarity
+                FROM capabilities
+                ORDER BY {index.distance()}
+                LIMIT %s;
+                """
+
+    def _history_sql(self) -> str:
+        index = self.history_index
+        return f"""
+                SELECT 
+                    c.name,
+                    c.type,
+                    c.llm_description,
+                    {index.similarity("cih.embedding")} as similarity
+                FROM capabilities c, capabilities_invoked_history cih
+                WHERE c.id = cih.capability_id
+                ORDER BY {index.distance("cih.embedding")}
+                LIMIT %s;
+                """
+
+    def check_indexes(self, limit=5) -> Dict[str, bool]:
+        """
+        用EXPLAIN确认相似度查询与历史查询走了向量索引
+
+        Returns:
+            索引名 -> 计划中是否使用了该索引
+        """
+        probe = to_vector_literal([1.0] + [0.0] * (config.embedding_model_dims - 1))
+        checks = {}
+        for index, sql in ((self.capability_index, self._similarity_sql()),
+                           (self.history_index, self._history_sql())):
+            try:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    index.configure(cursor, limit)
+                    used = index.uses_index(cursor, sql, (probe, probe, limit))
+                    usable = used
+                    if not used:
+                        # 小表上seq scan更便宜是正常的; 禁用seq scan后仍不走索引说明索引与查询不匹配
+                        cursor.execute("SELECT set_config('enable_seqscan', 'off', true);")
+                        usable = index.uses_index(cursor, sql, (probe, probe, limit))
+                    cursor.close()
+            except Exception as e:
+                logging.info(f"检查索引 {index.name} 失败: {e}")
+                checks[index.name] = False
+                continue
+            checks[index.name] = used
+            if used:
+                logging.info(f"查询使用了索引 {index.name}")
+            elif usable:
+                logging.info(f"索引 {index.name} 可用, 但规划器按代价选择了顺序扫描(表较小时属正常)")
+            else:
+                logging.warning(f"查询无法使用索引 {index.name}, 请检查距离度量({index.metric})与索引是否一致")
+        return checks
+
+    @staticmethod
+    def _copy_buffer(caps) -> io.StringIO:
+        buffer = io.StringIO()
+        for cap in caps:
+            llm_description = cap.llm_description
+            if llm_description is not None and not isinstance(llm_description, str):
+                llm_description = json.dumps(llm_description, ensure_ascii=False)
+            fields = (cap.name, cap.description, cap.type, to_vector_literal(cap.embedding_description),
+                      cap.original_body, llm_description, cap.function_impl)
+            buffer.write("\t".join(map(_copy_field, fields)))
+            buffer.write("\n")
+        buffer.seek(0)
+        return buffer
+
+    @tracer.start_as_current_span("insert_capabilities")
+    def insert_capabilities(self, caps: Iterable[Capability], rebuild_index=True) -> Dict[str, int]:
+        """
+        批量写入能力, 用于导入大型工具目录
+
+        描述按批(PG_INGEST_CHUNK_SIZE)计算嵌入, 下一批的嵌入与本批的COPY重叠进行;
+        所有行先COPY到临时表, 再在同一个事务中按name upsert并更新目录版本号.
+        同名能力被更新而不是报UniqueViolation; 描述与其他能力重复的会被跳过.
+        rebuild_index为True时按批量与表的相对大小处理向量索引(见PgVectorIndex.bulk_load_plan):
+        批量不小于现有行数时, 在upsert前并发删除索引, 提交后并发重建, 避免逐行维护索引
+        (重建完成前的查询走顺序扫描, 结果仍然正确); ivfflat的lists不再匹配行数时提交后重建;
+        否则索引随写入维护, 不做重建. 删除与重建都不阻塞查询.
+
+        Args:
+            caps: Capability列表, 同名时保留最后一个
+
+        Returns:
+            name -> id, 包含新插入和被更新的能力; 失败时为空
+        """
+        by_name = {cap.name: cap for cap in caps}
+        by_description = {}
+        for cap in by_name.values():
+            first = by_description.setdefault(cap.description, cap)
+            if first is not cap:
+                logging.info(f"跳过 '{cap.name}': 描述与 '{first.name}' 重复")
+        caps = list(by_description.values())
+        if not caps:
+            return {}
+        chunk_size = max(1, config.pg_ingest_chunk_size)
+        chunks = [caps[i:i + chunk_size] for i in range(0, len(caps), chunk_size)]
+        plan = self._bulk_load_plan(len(caps)) if rebuild_index else "keep"
+        dropped = False
+        try:
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="pg-ingest-embed") as embed_pool, \
+                    self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    CREATE TEMP TABLE capabilities_staging (
+                        name TEXT,
+                        description TEXT,
+                        type TEXT,
+                        embedding_description vector,
+                        original_body TEXT,
+                        llm_description JSONB,
+                        function_impl TEXT
+                    ) ON COMMIT DROP;
+                """)
+                pending = embed_pool.submit(Capability.prefetch_embeddings, chunks[0])
+                for i, chunk in enumerate(chunks):
+                    pending.result()
+                    if i + 1 < len(chunks):
+                        pending = embed_pool.submit(Capability.prefetch_embeddings, chunks[i + 1])
+                    cursor.copy_expert("""
+                        COPY capabilities_staging (name, description, type, embedding_description,
+                                                   original_body, llm_description, function_impl)
+                        FROM STDIN;
+                    """, self._copy_buffer(chunk))
+                if plan == "drop":
+                    dropped = self._drop_index(self.capability_index)
+                    if not dropped:
+                        plan = "keep"
+                # 描述唯一约束无法作为第二个冲突目标, 与其他能力描述重复的行提前过滤
+                cursor.execute("""
+                    INSERT INTO capabilities (name, description, type, embedding_description, original_body, llm_description, function_impl)
+                    SELECT s.name, s.description, s.type, s.embedding_description, s.original_body, s.llm_description, s.function_impl
+                    FROM capabilities_staging s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM capabilities c WHERE c.description = s.description AND c.name <> s.name
+                    )
+                    ON CONFLICT (name) DO UPDATE SET
+                        description = EXCLUDED.description,
+                        type = EXCLUDED.type,
+                        embedding_description = EXCLUDED.embedding_description,
+                        original_body = EXCLUDED.original_body,
+                        llm_description = EXCLUDED.llm_description,
+                        function_impl = EXCLUDED.function_impl
+                    RETURNING name, id;
+                """)
+                ids = dict(cursor.fetchall())
+                # 与写入在同一事务中更新目录版本号
+                self._bump_store_catalog_version(cursor)
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            logging.info(f"批量插入函数失败: {e}")
+            if dropped:
+                # 写入已回滚, 仍需恢复删除的索引, 否则相似度查询会一直顺序扫描
+                self._build_index(self.capability_index)
+            return {}
+        self.bump_catalog_version()
+        if len(ids) < len(caps):
+            logging.info(f"{len(caps) - len(ids)} 个能力的描述与已有能力重复, 已跳过")
+        logging.info(f"批量写入 {len(ids)} 个能力")
+        if plan != "keep":
+            self._build_index(self.capability_index)
+        return ids
+
+    def _bulk_load_plan(self, batch) -> str:
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT count(*) FROM capabilities;")
+                rows = cursor.fetchone()[0]
+                cursor.close()
+        except Exception as e:
+            logging.info(f"统计行数失败, 不重建索引: {e}")
+            return "keep"
+        plan = self.capability_index.bulk_load_plan(rows, batch)
+        logging.info(f"向{rows} 行的表批量写入 {batch} 个能力, 索引处理方式: {plan}")
+        return plan
+
+    def _drop_index(self, index: PgVectorIndex) -> bool:
+        """在另一个连接上并发删除索引; 暂存数据的事务尚未触及capabilities, 不会互相等待"""
+        try:
+            with self.pool.connection() as conn:
+                index.drop(conn)
+            return True
+        except Exception as e:
+            logging.info(f"删除索引 {index.name} 失败, 写入时继续维护索引: {e}")
+            return False
+
+    def _bump_store_catalog_version(self, cursor):
+        cursor.execute("UPDATE capabilities_catalog_version SET version = version + 1 WHERE id = 1;")
+
+    def catalog_version(self) -> int:
+        """数据库中的目录版本号, 其他进程的写入也会改变它; 读取失败时退回进程内计数"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT version FROM capabilities_catalog_version WHERE id = 1;")
+                row = cursor.fetchone()
+                cursor.close()
+            if row is not None:
+                return int(row[0])
+        except Exception as e:
+            logging.info(f"读取目录版本号失败: {e}")
+        return self._catalog_version
+
     @tracer.start_as_current_span("get_cap_by_name")
     def get_cap_by_name(self, name)-> Capability:
         """根据函数名查询"""
         try:
-            cursor = self.conn.cursor()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
             
-            select_sql = """
-            SELECT 
-                name,
-                type,
-                llm_description,
-                function_impl
-            FROM capabilities
-            WHERE name = %s;
-            """
+                select_sql = """
+                SELECT 
+                    name,
+                    type,
+                    llm_description,
+                    function_impl
+                FROM capabilities
+                WHERE name = %s;
+                """
             
-            cursor.execute(select_sql, (name,))
-            result = cursor.fetchall()
+                cursor.execute(select_sql, (name,))
+                result = cursor.fetchall()
             
-            cursor.close()
+                cursor.close()
 
             if result:
                 row = result[0]
                 logging.info(row)
-                try:
-                    llm_desc = json.loads(row[2]) if row[2] else {}
-                except:
-                    llm_desc = row[2]
-                return Capability(name=row[0], type=row[1], llm_description=llm_desc, function_impl=row[3])
+                return self._row_to_cap(row)
                 #[{"name":row[0],"type":row[1],"desc":llm_desc,"function_impl":row[3]}]
             else:
                 logging.info(f"未找到名为 '{name}' 的能力")
@@ -260,29 +557,63 @@ class PgVectorStore(StoreBase):
         except Exception as e:
             logging.info(f"查询失败: {e}")
             return None
-    
-    @tracer.start_as_current_span("search_by_similarity")
-    def search_by_similarity(self, msg:Msg, limit=5, min_similarity=0.5)-> Dict[str, Capability]:
-        """根据描述相似度查询函数"""
+
+    @staticmethod
+    def _row_to_cap(row) -> Capability:
+        """(name, type, llm_description, function_impl) 行转换为Capability"""
         try:
-            # 为查询文本生成嵌入向量)
-            cursor = self.conn.cursor()
-            query_embedding = msg.embed
-            search_sql = """
+            llm_desc = json.loads(row[2]) if row[2] else {}
+        except:
+            llm_desc = row[2]
+        return Capability(name=row[0], type=row[1], llm_description=llm_desc, function_impl=row[3])
+
+    @tracer.start_as_current_span("get_caps_by_names")
+    def get_caps_by_names(self, names) -> Dict[str, Capability]:
+        """根据多个函数名一次查询, 未找到的名字不出现在结果中"""
+        try:
+            return self.lookup_caps_by_names(names)
+        except Exception as e:
+            logging.info(f"查询失败: {e}")
+            return {}
+
+    def lookup_caps_by_names(self, names) -> Dict[str, Capability]:
+        """同get_caps_by_names, 但查询失败时抛出异常, 不当作未找到"""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            select_sql = """
             SELECT 
                 name,
                 type,
                 llm_description,
-                1 - (embedding_description <=> %s::vector) as similarity
+                function_impl
             FROM capabilities
-            ORDER BY embedding_description <=> %s::vector
-            LIMIT %s;
+            WHERE name = ANY(%s);
             """
+            cursor.execute(select_sql, (names,))
+            rows = cursor.fetchall()
+            cursor.close()
+        found = {row[0]: self._row_to_cap(row) for row in rows}
+        return {name: found[name] for name in names if name in found}
+    
+    @tracer.start_as_current_span("search_by_similarity")
+    def search_by_similarity(self, msg:Msg, limit=5, min_similarity=0.5)-> Dict[str, Capability]:
+        """根据描述相似度查询函数"""
+        try:
+            # 为查询文本生成嵌入向量)
+            # 先算好向量, 嵌入请求期间不占用连接
+            query_embedding = to_vector_literal(msg.embed)
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                self.capability_index.configure(cursor, limit)
+                search_sql = self._similarity_sql()
             
-            cursor.execute(search_sql, (query_embedding, query_embedding, limit))
-            results = cursor.fetchall()
+                cursor.execute(search_sql, (query_embedding, query_embedding, limit))
+                results = cursor.fetchall()
             
-            cursor.close()
+                cursor.close()
             logging.info("finish query db")
             
             if results:
@@ -306,21 +637,24 @@ class PgVectorStore(StoreBase):
             
         except Exception as e:
             logging.info(f"相似性搜索失败: {e}")
-            return {}
+            # None而不是{}: 失败的结果不会进入检索结果缓存
+            return None
 
     @tracer.start_as_current_span("record_cap_history")
     def record(self, msg:Msg, cap:Capability):
         try:
-            cursor = self.conn.cursor()
-            insert_sql = """
-                INSERT INTO capabilities_invoked_history (capability_id, embedding)
-                    SELECT c.id, %s
-                    FROM capabilities c
-                    WHERE c.name = %s;
-            """
-            cursor.execute(insert_sql, (msg.embed, cap.name))
-            self.conn.commit()
-            cursor.close()
+            query_embedding = to_vector_literal(msg.embed)
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                insert_sql = """
+                    INSERT INTO capabilities_invoked_history (capability_id, embedding)
+                        SELECT c.id, %s::vector
+                        FROM capabilities c
+                        WHERE c.name = %s;
+                """
+                cursor.execute(insert_sql, (query_embedding, cap.name))
+                conn.commit()
+                cursor.close()
             logging.info("record success")
         except Exception as e:
             logging.info(f"记录历史失败: {e}")
@@ -330,23 +664,16 @@ class PgVectorStore(StoreBase):
     def getCapsByHistory(self, msg:Msg, limit=5, min_similarity=0.5) -> Dict[str, Capability]:
         """根据历史记录查询函数"""
         try:
-            cursor = self.conn.cursor()
-            query_embedding = msg.embed
-            search_sql = """
-            SELECT 
-                c.name,
-                c.type,
-                c.llm_description,
-                1 - (cih.embedding <=> %s::vector) as similarity
-            FROM capabilities c, capabilities_invoked_history cih
-            WHERE c.id = cih.capability_id
-            ORDER BY cih.embedding <=> %s::vector
-            LIMIT %s;
-            """
+            # 先算好向量, 嵌入请求期间不占用连接
+            query_embedding = to_vector_literal(msg.embed)
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                self.history_index.configure(cursor, limit)
+                search_sql = self._history_sql()
             
-            cursor.execute(search_sql, (query_embedding, query_embedding, limit))
-            results = cursor.fetchall()
-            cursor.close()
+                cursor.execute(search_sql, (query_embedding, query_embedding, limit))
+                results = cursor.fetchall()
+                cursor.close()
             if results:
                 history_caps = {}
                 for row in results:
@@ -362,6 +689,7 @@ class PgVectorStore(StoreBase):
                 
                 logging.info(f"找到 {len(history_caps)} 个历史")
                 return history_caps
+            return {}
         except Exception as e:
             logging.info(f"根据历史记录查询函数失败: {e}")
-            return {}
\ No newline at end of file
+            return None
\ No newline at end of file
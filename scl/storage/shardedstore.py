@@ -0,0 +1,126 @@
+"""
+File system store spread over several skill roots.
+"""
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from scl.meta.capability import Capability
+from scl.meta.msg import Msg
+from scl.otel.otel import tracer
+from scl.storage.base import StoreBase
+from scl.storage.fsstore import fsstore
+
+
+class ShardedFsStore(StoreBase):
+    """
+    Mounts several skill roots (vendor, team, generated, ...) as independent fsstore shards.
+
+    Each shard keeps its own cache files, incremental refresh and watcher, so
+    refreshing one large root never blocks searches over the others. Queries fan
+    out to every shard on a thread pool (the matrix products release the GIL)
+    and the per-shard top-k lists are merged into a global top-k by score.
+
+    When two roots define the same skill name, name lookups return the one from
+    the earliest root, and searches keep the best-scoring one.
+    """
+
+    def __init__(self, paths: List[str], init, watch=False):
+        if not paths:
+            raise ValueError("ShardedFsStore needs at least one skill root")
+        self.paths = list(paths)
+        self._pool = ThreadPoolExecutor(max_workers=len(self.paths), thread_name_prefix="fsstore-shard")
+        # shards load (or refresh) their roots in parallel as well
+        self.shards = list(self._pool.map(lambda path: fsstore(path, init, watch=watch), self.paths))
+
+    def catalog_version(self) -> int:
+        return sum(shard.catalog_version() for shard in self.shards)
+
+    def shard(self, path) -> fsstore:
+        return self.shards[self.paths.index(path)]
+
+    def _fan_out(self, fn) -> list:
+        if len(self.shards) == 1:
+            return [fn(self.shards[0])]
+        return list(self._pool.map(fn, self.shards))
+
+    def refresh_cache(self, path=None) -> Dict[str, Tuple[int, int]]:
+        """
+        Refresh one root, or all of them in parallel.
+
+        Returns:
+            root -> (changed, removed) as returned by fsstore.refresh_cache
+        """
+        if path is not None:
+            return {path: self.shard(path).refresh_cache()}
+        return dict(zip(self.paths, self._fan_out(lambda shard: shard.refresh_cache())))
+
+    def start_watcher(self, interval=None):
+        for shard in self.shards:
+            shard.start_watcher(interval)
+
+    def stop_watcher(self):
+        for shard in self.shards:
+            shard.stop_watcher()
+
+    def close(self):
+        self.stop_watcher()
+        self._pool.shutdown(wait=False)
+
+    def get_cap_by_name(self, name) -> Capability:
+        for shard in self.shards:
+            cap = shard.get_cap_by_name(name)
+            if cap is not None:
+                return cap
+        return None
+
+    @tracer.start_as_current_span("get_caps_by_names")
+    def get_caps_by_names(self, names) -> Dict[str, Capability]:
+        """Resolve many names; the earliest root wins on duplicates, unknown names are left out."""
+        pending = list(dict.fromkeys(names))
+        found = {}
+        for shard in self.shards:
+            if not pending:
+                break
+            found.update(shard.get_caps_by_names(pending))
+            pending = [name for name in pending if name not in found]
+        return {name: found[name] for name in names if name in found}
+
+    @staticmethod
+    def _merge(results, limit) -> list:
+        """Global top-`limit` of per-shard (item, score) lists, one entry per name."""
+        merged, seen = [], set()
+        for item, score in heapq.merge(*results, key=lambda pair: -pair[1]):
+            name = item if isinstance(item, str) else item.name
+            if name in seen:
+                continue
+            seen.add(name)
+            merged.append((item, score))
+            if len(merged) == limit:
+                break
+        return merged
+
+    @tracer.start_as_current_span("search_by_similarity")
+    def search_by_similarity(self, msg: Msg, limit=5, min_similarity=0.5) -> Dict[str, Capability]:
+        """Top-k over all roots, best match first."""
+        query = msg.embed
+        results = self._fan_out(lambda shard: shard.search_scored(query, limit, min_similarity))
+        return {cap.name: cap for cap, _ in self._merge(results, limit)}
+
+    @tracer.start_as_current_span("record_cap_history")
+    def record(self, msg: Msg, cap: Capability):
+        ## recorded in the shard that owns the capability
+        if cap is None:
+            return
+        for shard in self.shards:
+            if shard.get_cap_by_name(cap.name) is not None:
+                shard.record(msg, cap)
+                return
+        logging.warning(f"Not recording {cap.name}: no skill root contains it")
+
+    @tracer.start_as_current_span("getCapsByHistory")
+    def getCapsByHistory(self, msg: Msg, limit=5, min_similarity=0.5) -> Dict[str, Capability]:
+        query = msg.embed
+        results = self._fan_out(lambda shard: shard.search_history(query, limit, min_similarity))
+        names = [name for name, _ in self._merge(results, limit)]
+        return self.get_caps_by_names(names)
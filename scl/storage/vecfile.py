@@ -0,0 +1,56 @@
+"""
+Versioned on-disk float32 matrix that can be opened with np.memmap.
+
+Layout: a fixed-size header (magic bytes followed by a space-padded JSON object)
+and then `count * dims` little-endian float32 values in row order. Files are
+written to a temporary name and renamed into place, so readers that already
+mapped the previous file keep a consistent view.
+"""
+import os
+import json
+import numpy as np
+from typing import Tuple
+
+MAGIC = b"SCLVEC\x00\x01"
+HEADER_SIZE = 4096
+FORMAT_VERSION = 1
+
+
+def write_vector_file(path, matrix, header: dict):
+    matrix = np.ascontiguousarray(matrix, dtype="<f4")
+    header = dict(header, version=FORMAT_VERSION, count=int(matrix.shape[0]), dims=int(matrix.shape[1]))
+    payload = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    if len(MAGIC) + len(payload) > HEADER_SIZE:
+        raise ValueError("vector file header too large")
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(payload.ljust(HEADER_SIZE - len(MAGIC), b" "))
+        f.write(matrix.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_vector_header(path) -> dict:
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE or not raw.startswith(MAGIC):
+        raise ValueError(f"{path} is not a vector file")
+    header = json.loads(raw[len(MAGIC):].decode("utf-8"))
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported vector file version {header.get('version')}")
+    return header
+
+
+def open_vector_file(path) -> Tuple[dict, np.ndarray]:
+    """Return (header, read-only matrix) with the matrix memory-mapped from disk."""
+    header = read_vector_header(path)
+    count, dims = int(header["count"]), int(header["dims"])
+    expected = HEADER_SIZE + count * dims * 4
+    if os.path.getsize(path) < expected:
+        raise ValueError(f"{path} is truncated")
+    if count == 0:
+        return header, np.zeros((0, dims), dtype=np.float32)
+    matrix = np.memmap(path, dtype="<f4", mode="r", offset=HEADER_SIZE, shape=(count, dims))
+    return header, matrix
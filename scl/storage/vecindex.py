@@ -0,0 +1,189 @@
+"""
+Vector search helpers shared by the in-process stores.
+"""
+import os
+import numpy as np
+from typing import List, Tuple
+
+
+def normalize_rows(matrix) -> np.ndarray:
+    """L2-normalize each row into a float32 matrix; zero rows stay zero."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def top_k(scores: np.ndarray, limit: int, min_similarity: float) -> List[Tuple[int, float]]:
+    """
+    Best `limit` (index, score) pairs of a score vector, highest first.
+
+    argpartition selects the candidates in O(n); only those are sorted.
+    """
+    if limit <= 0 or scores.size == 0:
+        return []
+    if limit < scores.size:
+        candidates = np.argpartition(-scores, limit - 1)[:limit]
+    else:
+        candidates = np.arange(scores.size)
+    candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return [(int(i), float(scores[i])) for i in candidates if scores[i] >= min_similarity]
+
+
+class FlatIndex:
+    """
+    Exact cosine search over a pre-normalized float32 embedding matrix.
+
+    A query costs one matrix-vector product plus argpartition, and a batch of
+    queries costs one matrix-matrix product.
+    """
+
+    def __init__(self, matrix, normalized: bool = False):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(0, 0)
+        self.matrix = matrix if normalized else normalize_rows(matrix)
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def dims(self) -> int:
+        return self.matrix.shape[1]
+
+    def scores(self, query) -> np.ndarray:
+        """Cosine similarity of one query against every row."""
+        return self.matrix @ normalize_rows(query)[0]
+
+    def search(self, query, limit=5, min_similarity=0.5) -> List[Tuple[int, float]]:
+        if len(self) == 0:
+            return []
+        return top_k(self.scores(query), limit, min_similarity)
+
+    def search_batch(self, queries, limit=5, min_similarity=0.5) -> List[List[Tuple[int, float]]]:
+        queries = normalize_rows(queries)
+        if len(self) == 0:
+            return [[] for _ in range(queries.shape[0])]
+        scores = queries @ self.matrix.T
+        return [top_k(row, limit, min_similarity) for row in scores]
+
+
+def spherical_kmeans(matrix: np.ndarray, k: int, iterations: int = 10, sample_size: int = 50000,
+                     seed: int = 0) -> np.ndarray:
+    """
+    k-means on unit vectors (cosine), trained on a random sample of rows.
+
+    Returns:
+        (k, dims) normalized centroids
+    """
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    k = max(1, min(int(k), n))
+    sample = matrix if n <= sample_size else matrix[np.sort(rng.choice(n, sample_size, replace=False))]
+    sample = np.asarray(sample, dtype=np.float32)
+    centroids = sample[rng.choice(sample.shape[0], k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=k)
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            # reseed empty clusters from random rows instead of dropping them
+            sums[empty] = sample[rng.choice(sample.shape[0], empty.size, replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate index over a list-ordered, normalized matrix.
+
+    Rows are grouped by nearest centroid, and list i covers rows
+    offsets[i]:offsets[i + 1]. A query scores the centroids, then the rows of the
+    `nprobe` best lists. Each list is a contiguous slice, so nothing is gathered
+    or copied. Use IVFIndex.train to get the row order that the matrix must be
+    stored in.
+    """
+
+    def __init__(self, matrix, centroids, offsets, nprobe: int = 8):
+        self.matrix = np.asarray(matrix, dtype=np.float32)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.nprobe = max(1, int(nprobe))
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @staticmethod
+    def train(matrix, nlist: int = 0, iterations: int = 10, seed: int = 0):
+        """
+        Cluster a normalized matrix.
+
+        Returns:
+            (order, centroids, offsets): store the matrix as matrix[order], then
+            build IVFIndex(matrix[order], centroids, offsets)
+        """
+        matrix = np.asarray(matrix, dtype=np.float32)
+        n = matrix.shape[0]
+        nlist = int(nlist) if nlist and nlist > 0 else max(1, int(np.sqrt(n)))
+        centroids = spherical_kmeans(matrix, nlist, iterations=iterations, seed=seed)
+        assign = np.empty(n, dtype=np.int64)
+        # assign in chunks to bound the temporary (chunk, nlist) score matrix
+        for start in range(0, n, 65536):
+            assign[start:start + 65536] = np.argmax(matrix[start:start + 65536] @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=centroids.shape[0]))))
+        return order, centroids, offsets
+
+    def search(self, query, limit=5, min_similarity=0.5, nprobe=None) -> List[Tuple[int, float]]:
+        if len(self) == 0 or limit <= 0:
+            return []
+        query = normalize_rows(query)[0]
+        nprobe = min(self.nlist, int(nprobe or self.nprobe))
+        centroid_scores = self.centroids @ query
+        if nprobe < self.nlist:
+            lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            lists = np.arange(self.nlist)
+        rows, scores = [], []
+        for i in lists:
+            start, end = self.offsets[i], self.offsets[i + 1]
+            if end > start:
+                rows.append(np.arange(start, end))
+                scores.append(self.matrix[start:end] @ query)
+        if not rows:
+            return []
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        return [(int(rows[i]), score) for i, score in top_k(scores, limit, min_similarity)]
+
+    def search_batch(self, queries, limit=5, min_similarity=0.5, nprobe=None) -> List[List[Tuple[int, float]]]:
+        return [self.search(query, limit, min_similarity, nprobe) for query in normalize_rows(queries)]
+
+    def recall(self, exact: FlatIndex, queries, k: int = 10, nprobe=None) -> float:
+        """Fraction of the exact top-k that the approximate search also returns."""
+        queries = normalize_rows(queries)
+        expected = exact.search_batch(queries, k, -1.0)
+        found = total = 0
+        for query, truth in zip(queries, expected):
+            approx = {row for row, _ in self.search(query, k, -1.0, nprobe)}
+            found += sum(row in approx for row, _ in truth)
+            total += len(truth)
+        return found / total if total else 1.0
+
+    def save(self, path, **extra):
+        """Persist centroids and list offsets (the vectors stay in the matrix file)."""
+        tmp_path = f"{path}.tmp.{os.getpid()}.npz"
+        np.savez(tmp_path, centroids=self.centroids, offsets=self.offsets,
+                 **{key: np.array(value) for key, value in extra.items()})
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load_params(path) -> dict:
+        with np.load(path, allow_pickle=False) as data:
+            return {key: data[key] for key in data.files}